@@ -0,0 +1,58 @@
+import random
+
+# deterministic synthetic SGF collections, one per shape the parser has to cope with;
+# sizes are multiplied by scale so the same cases can be run quickly or at length
+
+COORDINATES = 'abcdefghijklmnopqrs'
+
+def random_move(generator):
+    return generator.choice(COORDINATES) + generator.choice(COORDINATES)
+
+def random_text(generator, length):
+    words = []
+    while length > 0:
+        word = ''.join(generator.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(generator.randint(1, 10)))
+        words.append(word)
+        length -= len(word) + 1
+    return ' '.join(words)
+
+def moves(generator, count, first_colour = 0):
+    return ''.join(';{}[{}]'.format('BW'[(first_colour + index) % 2], random_move(generator)) for index in range(count))
+
+def long_main_line(generator, scale):
+    return '(;GM[1]FF[4]SZ[19]KM[6.5]' + moves(generator, 20000 * scale) + ')'
+
+def wide_variations(generator, scale):
+    variations = ''.join('(' + moves(generator, 5, 1) + ')' for _ in range(2000 * scale))
+    return '(;GM[1]FF[4]SZ[19];B[pd]' + variations + ')'
+
+def deep_variations(generator, scale):
+    depth = 2000 * scale
+    return '(;GM[1]FF[4]SZ[19]' + ''.join('(' + moves(generator, 2) + '(;B[aa])' for _ in range(depth)) + ')' * (depth + 1)
+
+def huge_comments(generator, scale):
+    return '(;GM[1]FF[4]SZ[19]' + ''.join(';B[{}]C[{}]'.format(random_move(generator), random_text(generator, 100000)) for _ in range(10 * scale)) + ')'
+
+def many_games(generator, scale):
+    return '\n'.join('(;GM[1]FF[4]SZ[19]PB[{}]PW[{}]RE[B+R]{})'.format(random_text(generator, 10), random_text(generator, 10), moves(generator, 10)) for _ in range(5000 * scale))
+
+def escapes(generator, scale):
+    # escaped brackets and backslashes, and soft line breaks in both line ending styles
+    pieces = [random_text(generator, 20), '\\]', '\\\\', '\\\n', '\\\r\n', '\\:']
+    comments = (''.join(generator.choice(pieces) for _ in range(50)) for _ in range(2000 * scale))
+    return '(;GM[1]FF[4]SZ[19]' + ''.join(';W[{}]C[{}]'.format(random_move(generator), comment) for comment in comments) + ')'
+
+CASES = {
+    'long_main_line': long_main_line,
+    'wide_variations': wide_variations,
+    'deep_variations': deep_variations,
+    'huge_comments': huge_comments,
+    'many_games': many_games,
+    'escapes': escapes,
+}
+
+def generate(name, scale = 1, seed = 0):
+    return CASES[name](random.Random(seed), scale).encode('ascii')
+
+def generate_corpus(scale = 1, seed = 0):
+    return {name: generate(name, scale, seed) for name in CASES}
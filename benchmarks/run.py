@@ -0,0 +1,111 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import benchmarks.corpus
+import tianyuan.gametree
+import tianyuan.sgfparser
+
+BUILDERS = {'default': tianyuan.gametree.GameTreeBuilder, 'compact': tianyuan.gametree.CompactGameTreeBuilder}
+BACKENDS = ['native', 'arpeggio']
+# metrics where a larger value is a regression
+TIMINGS = ['parse_seconds', 'check_seconds', 'traverse_seconds', 'peak_memory']
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def traverse(collection):
+    node_count = 0
+    for game_tree in collection:
+        for node in game_tree.iter_preorder():
+            game_tree.get_properties(node)
+            node_count += 1
+    return node_count
+
+def run_case(sgf_data, builder_class, repeat = 3, backend = 'native'):
+    # scanning and building is timed apart from the semantic checks, which run on fresh trees each time
+    parser = tianyuan.sgfparser.SGFParser(builder_class, validation = 'none', backend = backend)
+    checker = tianyuan.sgfparser.SGFParser(builder_class, backend = backend)
+    parse_seconds, collection = best_time(lambda: parser.parse_collection(sgf_data), repeat)
+    check_seconds = None
+    for _ in range(repeat):
+        unchecked = parser.parse_collection(sgf_data)
+        start = time.perf_counter()
+        for game_tree in unchecked:
+            checker.check_semantics(game_tree)
+        elapsed = time.perf_counter() - start
+        if check_seconds is None or elapsed < check_seconds:
+            check_seconds = elapsed
+    traverse_seconds, node_count = best_time(lambda: traverse(collection), repeat)
+    del collection, unchecked
+    tracemalloc.start()
+    collection = checker.parse_collection(sgf_data)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'bytes': len(sgf_data),
+        'nodes': node_count,
+        'parse_seconds': parse_seconds,
+        'parse_mb_per_second': len(sgf_data) / parse_seconds / 1e6,
+        'parse_nodes_per_second': node_count / parse_seconds,
+        'check_seconds': check_seconds,
+        'traverse_seconds': traverse_seconds,
+        'peak_memory': peak_memory,
+    }
+
+def run(scale = 1, repeat = 3, builder_class = tianyuan.gametree.GameTreeBuilder, cases = None, backend = 'native'):
+    # cases the backend cannot parse at all are left out of the results
+    results = {}
+    for name in cases or benchmarks.corpus.CASES:
+        try:
+            results[name] = run_case(benchmarks.corpus.generate(name, scale), builder_class, repeat, backend)
+        except tianyuan.sgfparser.SGFParserError as error:
+            print('{}: skipped, {}'.format(name, error.message), file = sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance = 0.1):
+    # returns (case, metric, baseline value, current value) for everything that got worse by more than tolerance
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        for metric in TIMINGS:
+            if metrics[metric] > baseline[name][metric] * (1 + tolerance):
+                regressions.append((name, metric, baseline[name][metric], metrics[metric]))
+    return regressions
+
+def main(arguments = None):
+    argument_parser = argparse.ArgumentParser(prog = 'python -m benchmarks.run', description = 'Time the SGF parser on a synthetic corpus.')
+    argument_parser.add_argument('-s', '--scale', type = int, default = 1, help = 'multiplier for the size of every case')
+    argument_parser.add_argument('-r', '--repeat', type = int, default = 3, help = 'number of runs, the fastest one counts')
+    argument_parser.add_argument('-b', '--builder', choices = sorted(BUILDERS), default = 'default', help = 'game tree builder to parse into')
+    argument_parser.add_argument('--backend', choices = BACKENDS, default = 'native', help = 'parser backend to time')
+    argument_parser.add_argument('-c', '--case', action = 'append', choices = sorted(benchmarks.corpus.CASES), help = 'run only this case (may be repeated)')
+    argument_parser.add_argument('--save', metavar = 'FILE', help = 'store the results as a JSON baseline')
+    argument_parser.add_argument('--compare', metavar = 'FILE', help = 'compare the results against a JSON baseline')
+    argument_parser.add_argument('--tolerance', type = float, default = 0.1, help = 'allowed slowdown before a metric counts as a regression')
+    arguments = argument_parser.parse_args(arguments)
+    results = run(arguments.scale, arguments.repeat, BUILDERS[arguments.builder], arguments.case, arguments.backend)
+    for name, metrics in results.items():
+        print('{:16} {:10.2f} MB/s {:12.0f} nodes/s  check {:8.4f} s  traverse {:8.4f} s  peak {:8.1f} MB'.format(name, metrics['parse_mb_per_second'], metrics['parse_nodes_per_second'], metrics['check_seconds'], metrics['traverse_seconds'], metrics['peak_memory'] / 1e6))
+    if arguments.save:
+        with open(arguments.save, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent = 2, sort_keys = True)
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), arguments.tolerance)
+        for name, metric, baseline_value, value in regressions:
+            print('{}: {} regressed from {:.4g} to {:.4g}'.format(name, metric, baseline_value, value), file = sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
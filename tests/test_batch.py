@@ -0,0 +1,65 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import tianyuan.batch
+
+class TestParseBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for name, sgf_data in [('a.sgf', b'(;SZ[9];B[aa];W[bb])'), ('b.sgf', b'(;B[aa])(;W[bb](;B[cc])(;B[dd]))'), ('c.sgf', b'(;B[aa]'), ('notes.txt', b'')]:
+            with open(os.path.join(self.directory.name, name), 'wb') as sgf_file:
+                sgf_file.write(sgf_data)
+    def tearDown(self):
+        self.directory.cleanup()
+    def test_find_sgf_files(self):
+        filenames = tianyuan.batch.find_sgf_files(self.directory.name)
+        self.assertEqual([os.path.basename(filename) for filename in filenames], ['a.sgf', 'b.sgf', 'c.sgf'])
+    def test_summaries(self):
+        result = tianyuan.batch.parse_batch(self.directory.name, workers = 1, chunksize = 2)
+        self.assertEqual([(os.path.basename(game.filename), game.index, game.node_count) for game in result.games], [('a.sgf', 0, 3), ('b.sgf', 0, 1), ('b.sgf', 1, 3)])
+        self.assertEqual(result.games[0].root_properties['SZ'], [9])
+    def test_errors_are_collected(self):
+        result = tianyuan.batch.parse_batch(self.directory.name, workers = 1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(os.path.basename(result.errors[0].filename), 'c.sgf')
+        self.assertEqual(result.errors[0].position, 7)
+    def test_process_pool(self):
+        result = tianyuan.batch.parse_batch(os.path.join(self.directory.name, '*.sgf'), workers = 2, chunksize = 1)
+        self.assertEqual(len(result.games), 3)
+        self.assertEqual(len(result.errors), 1)
+    def test_game_trees(self):
+        result = tianyuan.batch.parse_batch(self.directory.name, summarize = False, workers = 2)
+        filename, index, game_tree = result.games[0]
+        self.assertEqual(game_tree.get_root().properties['SZ'], [9])
+    def test_main(self):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = tianyuan.batch.main([self.directory.name, '--workers', '1'])
+        self.assertEqual(status, 1)
+        self.assertEqual([line.split('\t')[1:] for line in stdout.getvalue().splitlines()], [['0', '3'], ['0', '1'], ['1', '3']])
+        self.assertEqual(stderr.getvalue().splitlines()[-1], '3 games, 1 errors')
+
+class TestBatchErrors(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+    def tearDown(self):
+        self.directory.cleanup()
+    def write_sgf_file(self, name, sgf_data):
+        with open(os.path.join(self.directory.name, name), 'wb') as sgf_file:
+            sgf_file.write(sgf_data)
+    def test_byte_order_mark(self):
+        self.write_sgf_file('bom.sgf', b'\xef\xbb\xbf(;B[aa])')
+        self.write_sgf_file('good.sgf', b'(;B[aa])')
+        result = tianyuan.batch.parse_batch(self.directory.name, workers = 1)
+        self.assertEqual(len(result.games), 1)
+        self.assertEqual([(os.path.basename(error.filename), error.position) for error in result.errors], [('bom.sgf', 0)])
+    def test_deep_main_line(self):
+        self.write_sgf_file('deep.sgf', b'(;SZ[19]' + b';B[aa];W[bb]' * 1200 + b')')
+        self.write_sgf_file('good.sgf', b'(;B[aa])')
+        result = tianyuan.batch.parse_batch(self.directory.name, workers = 1)
+        self.assertEqual(result.errors, [])
+        self.assertEqual([(os.path.basename(game.filename), game.node_count) for game in result.games], [('deep.sgf', 2401), ('good.sgf', 1)])
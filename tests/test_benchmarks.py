@@ -0,0 +1,25 @@
+import unittest
+
+import benchmarks.corpus
+import benchmarks.run
+import tianyuan.gametree
+import tianyuan.sgfparser
+
+class TestCorpus(unittest.TestCase):
+    def test_deterministic(self):
+        self.assertEqual(benchmarks.corpus.generate('escapes', seed = 1), benchmarks.corpus.generate('escapes', seed = 1))
+        self.assertNotEqual(benchmarks.corpus.generate('escapes', seed = 1), benchmarks.corpus.generate('escapes', seed = 2))
+    def test_cases_are_valid(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+        for name in ['wide_variations', 'deep_variations', 'escapes']:
+            self.assertTrue(parser.parse_collection(benchmarks.corpus.generate(name)))
+
+class TestRun(unittest.TestCase):
+    def test_run_case(self):
+        results = benchmarks.run.run_case(b'(;SZ[19];B[aa](;W[bb])(;W[cc]))', tianyuan.gametree.GameTreeBuilder, repeat = 1)
+        self.assertEqual(results['nodes'], 4)
+        self.assertGreater(results['peak_memory'], 0)
+    def test_compare(self):
+        baseline = {'case': {'parse_seconds': 1.0, 'check_seconds': 1.0, 'traverse_seconds': 1.0, 'peak_memory': 100}}
+        results = {'case': {'parse_seconds': 1.05, 'check_seconds': 2.0, 'traverse_seconds': 0.5, 'peak_memory': 100}, 'new': {}}
+        self.assertEqual(benchmarks.run.compare(results, baseline), [('case', 'check_seconds', 1.0, 2.0)])
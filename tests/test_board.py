@@ -0,0 +1,94 @@
+import os
+import unittest
+
+import tianyuan.board
+import tianyuan.gametree
+import tianyuan.sgfparser
+
+def parse_game_tree(sgf_data):
+    parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+    return parser.parse_collection(sgf_data)[0]
+
+class TestBoard(unittest.TestCase):
+    def setUp(self):
+        self.board = tianyuan.board.Board(9)
+        self.board.begin_node()
+    def play(self, colour, coordinate):
+        return self.board.play(colour, self.board.get_point(coordinate))
+    def test_capture(self):
+        self.play(tianyuan.board.WHITE, (4, 4))
+        for coordinate in [(4, 3), (3, 4), (5, 4)]:
+            self.assertEqual(self.play(tianyuan.board.BLACK, coordinate), 0)
+        self.assertEqual(self.play(tianyuan.board.BLACK, (4, 5)), 1)
+        self.assertEqual(self.board.get((4, 4)), tianyuan.board.EMPTY)
+        self.assertEqual(len(self.board.get_stones(tianyuan.board.BLACK)), 4)
+    def test_play_outside_node(self):
+        board = tianyuan.board.Board(9)
+        board.play(tianyuan.board.BLACK, 0)
+        self.assertEqual(board.get((0, 0)), tianyuan.board.BLACK)
+        self.assertEqual(board.history, [])
+    def test_capture_group(self):
+        for coordinate in [(0, 0), (1, 0)]:
+            self.play(tianyuan.board.WHITE, coordinate)
+        for coordinate in [(0, 1), (1, 1)]:
+            self.play(tianyuan.board.BLACK, coordinate)
+        self.assertEqual(self.play(tianyuan.board.BLACK, (2, 0)), 2)
+        self.assertEqual(self.board.get_stones(tianyuan.board.WHITE), [])
+    def test_suicide(self):
+        for coordinate in [(1, 0), (0, 1)]:
+            self.play(tianyuan.board.BLACK, coordinate)
+        self.play(tianyuan.board.WHITE, (0, 0))
+        self.assertEqual(self.board.get_stones(tianyuan.board.WHITE), [])
+    def test_undo(self):
+        self.play(tianyuan.board.BLACK, (1, 0))
+        empty_hash = self.board.empty_hash
+        position_hash = self.board.hash
+        self.board.begin_node()
+        self.play(tianyuan.board.BLACK, (0, 1))
+        self.play(tianyuan.board.WHITE, (0, 0))
+        self.board.undo()
+        self.assertEqual(self.board.hash, position_hash)
+        self.assertEqual(self.board.get_stones(tianyuan.board.BLACK), [(1, 0)])
+        self.board.undo()
+        self.assertEqual(self.board.hash, empty_hash)
+    def test_hash_is_order_independent(self):
+        self.play(tianyuan.board.BLACK, (2, 2))
+        self.play(tianyuan.board.WHITE, (6, 6))
+        other_board = tianyuan.board.Board(9)
+        other_board.begin_node()
+        other_board.play(tianyuan.board.WHITE, other_board.get_point((6, 6)))
+        other_board.play(tianyuan.board.BLACK, other_board.get_point((2, 2)))
+        self.assertEqual(self.board.hash, other_board.hash)
+    def test_hash_depends_on_board_size(self):
+        # same flat point index, different board sizes
+        small_board = tianyuan.board.Board(9)
+        large_board = tianyuan.board.Board(19)
+        small_board.play(tianyuan.board.BLACK, small_board.get_point((0, 1)))
+        large_board.play(tianyuan.board.BLACK, large_board.get_point((9, 0)))
+        self.assertNotEqual(small_board.hash, large_board.hash)
+        self.assertNotEqual(small_board.get_canonical_hash(), large_board.get_canonical_hash())
+        self.assertNotEqual(tianyuan.board.Board(9).hash, tianyuan.board.Board(19).hash)
+    def test_raw_values(self):
+        self.assertEqual(self.board.to_points(b'ab:bc'), [9, 10, 18, 19])
+        self.assertEqual(self.board.to_points(b'tt'), [])
+
+class TestReplay(unittest.TestCase):
+    def test_replay_path(self):
+        game_tree = parse_game_tree(b'(;SZ[9]AB[aa][ba];W[ab];B[ee];W[bb];B[ff];W[ca])')
+        board = tianyuan.board.replay(game_tree, game_tree.iter_main_line())
+        self.assertEqual(board.get_stones(tianyuan.board.BLACK), [(4, 4), (5, 5)])
+        self.assertEqual(board.get_stones(tianyuan.board.WHITE), [(2, 0), (0, 1), (1, 1)])
+    def test_iter_positions(self):
+        game_tree = parse_game_tree(b'(;SZ[9];B[aa](;W[bb])(;W[cc];B[dd]))')
+        positions = [(tuple(board.get_stones(tianyuan.board.BLACK)), tuple(board.get_stones(tianyuan.board.WHITE))) for node, board in tianyuan.board.iter_positions(game_tree)]
+        self.assertEqual(positions, [((), ()), (((0, 0),), ()), (((0, 0),), ((1, 1),)), (((0, 0),), ((2, 2),)), (((0, 0), (3, 3)), ((2, 2),))])
+    def test_iter_positions_bundled_game(self):
+        with open(os.path.join(os.path.dirname(__file__), 'LS vs AG - G1 - English.sgf'), 'rb') as sgf_file:
+            game_tree = parse_game_tree(sgf_file.read())
+        board = None
+        node_count = 0
+        for node, board in tianyuan.board.iter_positions(game_tree):
+            node_count += 1
+        self.assertEqual(node_count, len(list(game_tree.iter_preorder())))
+        # every node has been undone again
+        self.assertEqual((board.hash, board.history, set(board.points)), (board.empty_hash, [], {tianyuan.board.EMPTY}))
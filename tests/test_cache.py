@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+import unittest
+
+import tianyuan.cache
+import tianyuan.gametree
+import tianyuan.sgfparser
+import tianyuan.sinks
+
+SGF_DATA = b'(;SZ[9]C[a \\] b];B[cc](;W[gg]C[x])(;W[gc];B[cg]))(;SZ[13])'
+
+class TestGameTreeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'game.sgf')
+        self.write_source(SGF_DATA)
+        self.cache = tianyuan.cache.GameTreeCache(os.path.join(self.directory.name, 'cache'))
+    def tearDown(self):
+        self.directory.cleanup()
+    def write_source(self, sgf_data, filename = None):
+        with open(filename or self.filename, 'wb') as sgf_file:
+            sgf_file.write(sgf_data)
+    def parse_file(self, filename = None):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, cache = self.cache)
+        return parser.parse_file(filename or self.filename)
+    def parse_file_with(self, builder_class, filename = None, **options):
+        parser = tianyuan.sgfparser.SGFParser(builder_class, cache = self.cache, **options)
+        return parser, parser.parse_file(filename or self.filename)
+    def get_nodes(self, collection):
+        return [[dict(game_tree.get_properties(node)) for node in game_tree.iter_preorder()] for game_tree in collection]
+    def test_hit(self):
+        expected = self.get_nodes(self.parse_file())
+        self.assertIsNotNone(self.cache.load(self.filename, 'full'))
+        collection = self.parse_file()
+        self.assertEqual(self.get_nodes(collection), expected)
+        self.assertEqual(collection[0].get_root_property('SZ'), [9])
+        self.assertEqual(len(collection[0].get_children(collection[0].get_children(collection[0].get_root())[0])), 2)
+    def test_miss(self):
+        self.assertIsNone(self.cache.load(self.filename, 'full'))
+    def test_modified_source(self):
+        self.parse_file()
+        self.write_source(b'(;SZ[19];B[dd])')
+        self.assertIsNone(self.cache.load(self.filename, 'full'))
+        self.assertEqual(self.parse_file()[0].get_root_property('SZ'), [19])
+    def test_touched_source(self):
+        self.parse_file()
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(self.cache.load(self.filename, 'full'))
+    def test_eviction(self):
+        self.parse_file()
+        cache_filename = self.cache.get_cache_filename(self.filename)
+        self.cache.max_size = os.path.getsize(cache_filename)
+        os.utime(cache_filename, ns = (0, 0))
+        other_filename = os.path.join(self.directory.name, 'other.sgf')
+        self.write_source(b'(;SZ[9])', other_filename)
+        self.parse_file(other_filename)
+        self.assertFalse(os.path.exists(cache_filename))
+        self.assertTrue(os.path.exists(self.cache.get_cache_filename(other_filename)))
+    def test_hit_skips_validation(self):
+        self.parse_file()
+        for builder_class in [tianyuan.gametree.GameTreeBuilder, tianyuan.gametree.CompactGameTreeBuilder]:
+            parser = tianyuan.sgfparser.SGFParser(builder_class, cache = self.cache)
+            parser.check_semantics = None
+            collection = parser.parse_file(self.filename)
+            self.assertEqual(self.get_nodes(collection)[0][0], {'SZ': [9], 'C': ['a ] b'], 'CA': ['iso-8859-1']})
+            self.assertEqual(collection[0].get_depth(collection[0].get_children(collection[0].get_root())[0]), 1)
+    def test_validation_level(self):
+        self.parse_file()
+        self.assertIsNone(self.cache.load(self.filename, 'none'))
+        parser, collection = self.parse_file_with(tianyuan.gametree.GameTreeBuilder, validation = 'none')
+        self.assertEqual(collection[0].get_properties(collection[0].get_root())['C'], [b'a ] b'])
+        self.assertIsNotNone(self.cache.load(self.filename, 'none'))
+    def test_sink(self):
+        outputs = []
+        for _ in range(2):
+            json_file = io.StringIO()
+            parser, collection = self.parse_file_with(lambda: tianyuan.sinks.JSONLinesWriter(json_file))
+            self.assertEqual(collection, [])
+            outputs.append(json_file.getvalue())
+        self.assertFalse(self.cache.load(self.filename, 'full').validated)
+        self.assertEqual(outputs[1], outputs[0])
+        self.assertEqual(len(outputs[0].splitlines()), 6)
+    def test_stats(self):
+        self.parse_file()
+        parser, collection = self.parse_file_with(tianyuan.gametree.GameTreeBuilder, stats = True)
+        self.assertEqual((parser.stats.bytes, parser.stats.game_trees, parser.stats.nodes), (len(SGF_DATA), 2, 6))
@@ -0,0 +1,104 @@
+import pickle
+import unittest
+
+import tianyuan.gametree
+import tianyuan.sgfparser
+
+SGF_DATA = b'(;SZ[9];B[aa](;W[bb];B[cc])(;W[dd]AB[ee][ff]))'
+
+class TestGameTree(unittest.TestCase):
+    game_tree_builder_class = tianyuan.gametree.GameTreeBuilder
+    def setUp(self):
+        parser = tianyuan.sgfparser.SGFParser(self.game_tree_builder_class)
+        self.game_tree = parser.parse_collection(SGF_DATA)[0]
+    def get_main_line(self):
+        main_line = [self.game_tree.get_root()]
+        while self.game_tree.get_children(main_line[-1]):
+            main_line.append(self.game_tree.get_children(main_line[-1])[0])
+        return main_line
+    def test_root_properties(self):
+        self.assertEqual(self.game_tree.get_root_property('SZ'), [9])
+        self.assertEqual(self.game_tree.get_root_property('CA'), ['iso-8859-1'])
+    def test_children(self):
+        root = self.game_tree.get_root()
+        first_move = self.game_tree.get_children(root)[0]
+        variations = self.game_tree.get_children(first_move)
+        self.assertEqual(len(variations), 2)
+        self.assertEqual([self.game_tree.get_properties(node)['W'] for node in variations], [[(1, 1)], [(3, 3)]])
+        self.assertEqual(self.game_tree.get_properties(variations[1])['AB'], [(4, 4), (5, 5)])
+    def test_main_line(self):
+        self.assertEqual([list(self.game_tree.get_properties(node)) for node in self.get_main_line()], [['SZ', 'CA'], ['B'], ['W'], ['B']])
+    def test_iter_preorder(self):
+        moves = [self.game_tree.get_properties(node).get('B', self.game_tree.get_properties(node).get('W')) for node in self.game_tree.iter_preorder()]
+        self.assertEqual(moves, [None, [(0, 0)], [(1, 1)], [(2, 2)], [(3, 3)]])
+    def test_iter_preorder_subtree(self):
+        first_move = self.game_tree.get_children(self.game_tree.get_root())[0]
+        variation = self.game_tree.get_children(first_move)[0]
+        self.assertEqual(len(list(self.game_tree.iter_preorder(variation))), 2)
+    def test_iter_main_line(self):
+        self.assertEqual(list(self.game_tree.iter_main_line()), self.get_main_line())
+    def test_set_property(self):
+        leaf = self.get_main_line()[-1]
+        self.game_tree.set_property(leaf, 'B', [(3, 4)])
+        self.game_tree.set_property(leaf, 'C', [b'comment'])
+        self.assertEqual(dict(self.game_tree.get_properties(leaf)), {'B': [(3, 4)], 'C': [b'comment']})
+    def test_properties_write_through(self):
+        leaf = self.get_main_line()[-1]
+        self.game_tree.get_properties(leaf)['B'] = [(5, 6)]
+        self.game_tree.get_properties(leaf)['C'] = [b'comment']
+        self.assertEqual(dict(self.game_tree.get_properties(leaf)), {'B': [(5, 6)], 'C': [b'comment']})
+    def test_navigation(self):
+        root, first_move, reply, last_move = self.get_main_line()
+        other_reply = self.game_tree.get_children(first_move)[1]
+        self.assertEqual(self.game_tree.get_parent(other_reply), first_move)
+        self.assertIsNone(self.game_tree.get_parent(root))
+        self.assertEqual([self.game_tree.get_depth(node) for node in (root, first_move, other_reply, last_move)], [0, 1, 2, 3])
+        self.assertEqual(self.game_tree.get_path(last_move), [root, first_move, reply, last_move])
+        self.assertEqual(self.game_tree.get_move_number(last_move), 3)
+    def test_siblings(self):
+        first_move = self.get_main_line()[1]
+        reply, other_reply = self.game_tree.get_children(first_move)
+        self.assertEqual(self.game_tree.get_next_sibling(reply), other_reply)
+        self.assertIsNone(self.game_tree.get_next_sibling(other_reply))
+        self.assertEqual(self.game_tree.get_previous_sibling(other_reply), reply)
+        self.assertIsNone(self.game_tree.get_previous_sibling(reply))
+        self.assertEqual(list(self.game_tree.iter_siblings(other_reply)), [reply, other_reply])
+        self.assertEqual(self.game_tree.get_variation_index(other_reply), 1)
+    def test_main_line_membership(self):
+        first_move = self.get_main_line()[1]
+        self.assertTrue(all(self.game_tree.is_on_main_line(node) for node in self.get_main_line()))
+        self.assertFalse(self.game_tree.is_on_main_line(self.game_tree.get_children(first_move)[1]))
+    def test_intervals(self):
+        root, first_move, reply, last_move = self.get_main_line()
+        other_reply = self.game_tree.get_children(first_move)[1]
+        self.assertTrue(self.game_tree.is_ancestor(first_move, last_move))
+        self.assertTrue(self.game_tree.is_ancestor(root, root))
+        self.assertFalse(self.game_tree.is_ancestor(other_reply, last_move))
+        self.assertFalse(self.game_tree.is_ancestor(last_move, first_move))
+        self.assertEqual([self.game_tree.get_subtree_size(node) for node in (root, first_move, reply, other_reply)], [5, 4, 2, 1])
+    def test_intervals_follow_changes(self):
+        leaf = self.get_main_line()[-1]
+        self.assertEqual(self.game_tree.get_subtree_size(self.game_tree.get_root()), 5)
+        child = self.game_tree.add_node(tianyuan.gametree.GameTreeNode(), leaf)
+        self.assertEqual(self.game_tree.get_subtree_size(self.game_tree.get_root()), 6)
+        self.assertTrue(self.game_tree.is_ancestor(leaf, child))
+        self.game_tree.remove_node(self.get_main_line()[1])
+        self.assertEqual(self.game_tree.get_subtree_size(self.game_tree.get_root()), 2)
+    def test_read_access_does_not_change_the_tree(self):
+        leaf = self.get_main_line()[-1]
+        state = pickle.dumps(self.game_tree)
+        self.game_tree.get_children(leaf)
+        self.game_tree.get_path(leaf)
+        list(self.game_tree.iter_siblings(leaf))
+        self.assertEqual(pickle.dumps(self.game_tree), state)
+    def test_pickle(self):
+        game_tree = pickle.loads(pickle.dumps(self.game_tree))
+        self.assertEqual(game_tree.get_root_property('SZ'), [9])
+
+class TestCompactGameTree(TestGameTree):
+    game_tree_builder_class = tianyuan.gametree.CompactGameTreeBuilder
+    def test_node_handles(self):
+        self.assertEqual(self.game_tree.get_root(), 0)
+        self.assertEqual(list(self.game_tree.parent), [-1, 0, 1, 2, 1])
+    def test_identifiers_are_shared(self):
+        self.assertEqual(self.game_tree.identifiers, ['SZ', 'B', 'W', 'AB'])
@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+
+import tianyuan.board
+import tianyuan.gametree
+import tianyuan.index
+import tianyuan.sgfparser
+
+def parse_game_tree(sgf_data):
+    parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+    return parser.parse_collection(sgf_data)[0]
+
+class TestPositionIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        writer = tianyuan.index.PositionIndexWriter(self.directory.name, run_size = 3)
+        writer.add_game_tree('a.sgf', 0, parse_game_tree(b'(;SZ[9];B[cc];W[gg](;B[cg])(;B[gc]))'))
+        # the same opening reflected and with colours swapped
+        writer.add_game_tree('b.sgf', 0, parse_game_tree(b'(;SZ[9];W[gc];B[cg])'))
+        writer.close()
+        self.writer = writer
+    def tearDown(self):
+        self.directory.cleanup()
+    def lookup(self, sgf_data):
+        game_tree = parse_game_tree(sgf_data)
+        board = tianyuan.board.replay(game_tree, game_tree.iter_main_line())
+        index = tianyuan.index.PositionIndex(self.directory.name)
+        try:
+            return sorted(index.lookup_board(board))
+        finally:
+            index.close()
+    def test_exact_position(self):
+        self.assertEqual(self.lookup(b'(;SZ[9];B[cc];W[gg];B[cg])'), [('a.sgf', 0, 3), ('a.sgf', 0, 4)])
+    def test_symmetric_position(self):
+        self.assertEqual(self.lookup(b'(;SZ[9];B[gg];W[cc])'), [('a.sgf', 0, 2), ('b.sgf', 0, 2)])
+    def test_missing_position(self):
+        self.assertEqual(self.lookup(b'(;SZ[9];B[ee])'), [])
+    def test_merge(self):
+        self.assertGreater(len(self.writer.runs), 1)
+        self.writer.merge()
+        self.assertEqual(len(self.writer.runs), 1)
+        self.assertEqual(len(self.lookup(b'(;SZ[9])')), 2)
+    def test_incremental(self):
+        writer = tianyuan.index.PositionIndexWriter(self.directory.name)
+        writer.add_game_tree('c.sgf', 3, parse_game_tree(b'(;SZ[9];B[ee])'))
+        writer.close()
+        self.assertEqual(self.lookup(b'(;SZ[9];B[ee])'), [('c.sgf', 3, 1)])
+    def test_board_sizes(self):
+        writer = tianyuan.index.PositionIndexWriter(self.directory.name)
+        writer.add_game_tree('large.sgf', 0, parse_game_tree(b'(;SZ[19];B[ja])'))
+        writer.close()
+        self.assertEqual(self.lookup(b'(;SZ[9];B[ab])'), [])
+        self.assertEqual(self.lookup(b'(;SZ[19])'), [('large.sgf', 0, 0)])
+        self.assertEqual(self.lookup(b'(;SZ[19];B[ja])'), [('large.sgf', 0, 1)])
+    def test_resolve_node_path(self):
+        game_tree = parse_game_tree(b'(;SZ[9];B[cc];W[gg](;B[cg])(;B[gc]))')
+        self.assertEqual(tianyuan.index.resolve_node_path(game_tree, 4), [0, 0, 1])
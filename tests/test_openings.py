@@ -0,0 +1,85 @@
+import functools
+import os
+import tempfile
+import unittest
+
+import tianyuan.gametree
+import tianyuan.openings
+import tianyuan.sgfparser
+
+SGF_DATA = b'''(;SZ[19]RE[B+R];B[pd];W[dp];B[pp])
+(;SZ[19]RE[W+3.5];B[pd];W[dp];B[dd])
+(;SZ[19]RE[B+T];B[pd];W[dd](;B[pp])(;B[dp]))
+(;SZ[19]RE[0];B[dp];W[pd])'''
+
+class TestOpeningTree(unittest.TestCase):
+    def build(self, **options):
+        opening_tree = tianyuan.openings.OpeningTree(**options)
+        parser = tianyuan.sgfparser.SGFParser(functools.partial(tianyuan.openings.OpeningTreeBuilder, opening_tree))
+        parser.parse_collection(SGF_DATA)
+        return opening_tree
+    def test_continuations(self):
+        opening_tree = self.build()
+        self.assertEqual([(statistics.move, statistics.visits, statistics.black_wins, statistics.white_wins) for statistics in opening_tree.get_continuations()], [(('B', (15, 3)), 3, 2, 1), (('B', (3, 15)), 1, 0, 0)])
+        node = opening_tree.find([('B', (15, 3))])
+        self.assertEqual([statistics.move for statistics in opening_tree.get_continuations(node)], [('W', (3, 15)), ('W', (3, 3))])
+        self.assertEqual(opening_tree.get_statistics(opening_tree.find([('B', (15, 3)), ('W', (3, 3))])).games, [2])
+    def test_main_line_only(self):
+        opening_tree = self.build()
+        self.assertIsNone(opening_tree.find([('B', (15, 3)), ('W', (3, 3)), ('B', (3, 15))]))
+        self.assertEqual(opening_tree.get_path(opening_tree.find([('B', (15, 3)), ('W', (3, 3)), ('B', (15, 15))])), [('B', (15, 3)), ('W', (3, 3)), ('B', (15, 15))])
+    def test_order_follows_visits(self):
+        opening_tree = tianyuan.openings.OpeningTree()
+        for point in [(0, 0), (1, 1), (1, 1), (2, 2), (2, 2), (2, 2)]:
+            opening_tree.add_moves([('B', point)])
+        self.assertEqual([(statistics.move[1], statistics.visits) for statistics in opening_tree.get_continuations(count = 2)], [((2, 2), 3), ((1, 1), 2)])
+    def test_symmetries(self):
+        opening_tree = self.build(normalize_symmetries = True)
+        self.assertEqual(opening_tree.get_statistics(opening_tree.find([('B', (3, 3))])).visits, 4)
+        self.assertEqual(opening_tree.get_statistics(opening_tree.find([('B', (15, 15)), ('W', (3, 3))])).visits, 3)
+    def test_game_tree(self):
+        opening_tree = tianyuan.openings.OpeningTree()
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+        for index, game_tree in enumerate(parser.parse_collection(SGF_DATA)):
+            opening_tree.add_game_tree(game_tree, index)
+        self.assertEqual(len(opening_tree), len(self.build()))
+        self.assertEqual(opening_tree.get_statistics(0).black_wins, 2)
+    def test_prune(self):
+        opening_tree = self.build()
+        opening_tree.prune(2)
+        self.assertEqual(opening_tree.get_path(len(opening_tree) - 1), [('B', (15, 3)), ('W', (3, 15))])
+        self.assertEqual(len(opening_tree), 3)
+    def test_max_nodes(self):
+        opening_tree = self.build(max_nodes = 4)
+        self.assertLessEqual(len(opening_tree), 4)
+        self.assertEqual(opening_tree.get_statistics(0).visits, 4)
+    def test_bounded_pruning(self):
+        opening_tree = tianyuan.openings.OpeningTree(max_nodes = 2000)
+        prunes = []
+        prune = opening_tree.prune
+        opening_tree.prune = lambda minimum_count: prunes.append(minimum_count) or prune(minimum_count)
+        prefix = [('B', (15, 3)), ('W', (3, 15)), ('B', (16, 16))]
+        true_counts = {}
+        for game in range(3000):
+            tail = [('W', (game % 19, game // 19 % 19)), ('B', (game // 361 % 19, 9))]
+            opening_tree.add_moves(prefix + tail)
+            true_counts[tail[0]] = true_counts.get(tail[0], 0) + 1
+        self.assertLessEqual(len(opening_tree), 2000)
+        self.assertLessEqual(len(prunes), 5)
+        statistics = opening_tree.get_statistics(opening_tree.find(prefix))
+        self.assertEqual((statistics.visits, statistics.error), (3000, 0))
+        for move, count in true_counts.items():
+            node = opening_tree.find(prefix + [move])
+            if node is not None:
+                statistics = opening_tree.get_statistics(node)
+                self.assertLessEqual(statistics.visits, count)
+                self.assertLessEqual(count, statistics.visits + statistics.error)
+    def test_save_and_load(self):
+        opening_tree = self.build()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'openings.bin')
+            opening_tree.save(filename)
+            loaded = tianyuan.openings.OpeningTree.load(filename)
+        self.assertEqual(loaded.get_continuations(), opening_tree.get_continuations())
+        node = loaded.find([('B', (15, 3)), ('W', (3, 3))])
+        self.assertEqual(loaded.get_statistics(node), opening_tree.get_statistics(node))
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 import tianyuan.gametree
@@ -5,91 +6,133 @@ import tianyuan.sgfparser
 
 class TestPropertyValue(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_empty_value(self):
-        self.assertEqual(self.parser.parse_property_value(b'[]'), (b'', b''))
+        self.parser.reset(b'[]')
+        self.assertEqual(self.parser.parse_property_value(), b'')
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_simple_value(self):
-        self.assertEqual(self.parser.parse_property_value(b'[test]'), (b'', b'test'))
+        self.parser.reset(b'[test]')
+        self.assertEqual(self.parser.parse_property_value(), b'test')
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_leading_whitespace(self):
-        self.assertEqual(self.parser.parse_property_value(b' \n \t [test]'), (b'', b'test'))
+        self.parser.reset(b' \n \t [test]')
+        self.assertEqual(self.parser.parse_property_value(), b'test')
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_escaped_chars(self):
-        self.assertEqual(self.parser.parse_property_value(b'[t\:e\\\\s\]t]'), (b'', b't:e\\s]t'))
+        self.parser.reset(b'[t\:e\\\\s\]t]')
+        self.assertEqual(self.parser.parse_property_value(), b't:e\\s]t')
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_trailing_chars(self):
-        self.assertEqual(self.parser.parse_property_value(b'[test]abc'), (b'abc', b'test'))
+        self.parser.reset(b'[test]abc')
+        self.assertEqual(self.parser.parse_property_value(), b'test')
+        self.assertEqual(self.parser.get_remaining_data(), b'abc')
     def test_unexpected_start(self):
+        self.parser.reset(b'test]')
         with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
-            self.parser.parse_property_value(b'test]')
+            self.parser.parse_property_value()
         self.assertEqual(cm.exception.position, 0)
     def test_unexpected_end(self):
+        self.parser.reset(b'[test')
         with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
-            self.parser.parse_property_value(b'[test')
+            self.parser.parse_property_value()
         self.assertEqual(cm.exception.position, 5)
 
 class TestPropertyIdentifier(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_single_letter(self):
-        self.assertEqual(self.parser.parse_property_identifier(b'A[test]'), (b'[test]', 'A'))
+        self.parser.reset(b'A[test]')
+        self.assertEqual(self.parser.parse_property_identifier(), 'A')
+        self.assertEqual(self.parser.get_remaining_data(), b'[test]')
     def test_multiple_letters(self):
-        self.assertEqual(self.parser.parse_property_identifier(b'AB[test]'), (b'[test]', 'AB'))
+        self.parser.reset(b'AB[test]')
+        self.assertEqual(self.parser.parse_property_identifier(), 'AB')
+        self.assertEqual(self.parser.get_remaining_data(), b'[test]')
     def test_non_ucletter_first(self):
+        self.parser.reset(b'a[test]')
         with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
-            self.parser.parse_property_identifier(b'a[test]')
+            self.parser.parse_property_identifier()
         self.assertEqual(cm.exception.position, 0)
     def test_non_ucletter_last(self):
-        self.assertEqual(self.parser.parse_property_identifier(b'Ab[test]'), (b'b[test]', 'A'))
+        self.parser.reset(b'Ab[test]')
+        self.assertEqual(self.parser.parse_property_identifier(), 'A')
+        self.assertEqual(self.parser.get_remaining_data(), b'b[test]')
 
 class TestProperty(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_single_value(self):
-        self.assertEqual(self.parser.parse_property(b'A[test]'), (b'', 'A', [b'test']))
+        self.parser.reset(b'A[test]')
+        self.assertEqual(self.parser.parse_property(), ('A', [b'test']))
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_multiple_values(self):
-        self.assertEqual(self.parser.parse_property(b'AB[test][2]'), (b'', 'AB', [b'test', b'2']))
+        self.parser.reset(b'AB[test][2]')
+        self.assertEqual(self.parser.parse_property(), ('AB', [b'test', b'2']))
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_illegal_identifier(self):
+        self.parser.reset(b'Ab[test]')
         with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
-            self.parser.parse_property(b'Ab[test]')
+            self.parser.parse_property()
         self.assertEqual(cm.exception.position, 1)
 
 class TestNode(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_empty_node(self):
-        self.assertEqual(self.parser.parse_node(b';', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b';')
+        self.parser.parse_node(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_single_property(self):
-        self.assertEqual(self.parser.parse_node(b';A[test]', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b';A[test]')
+        self.parser.parse_node(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_multiple_properties(self):
-        self.assertEqual(self.parser.parse_node(b';A[test]B[test]C[test]', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b';A[test]B[test]C[test]')
+        self.parser.parse_node(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_illegal_node(self):
+        self.parser.reset(b'A[test]')
         with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
-            self.parser.parse_node(b'A[test]', tianyuan.gametree.DotFileBuilder())
+            self.parser.parse_node(tianyuan.gametree.GameTreeBuilder())
         self.assertEqual(cm.exception.position, 0)
 
 class TestSequence(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_single_node(self):
-        self.assertEqual(self.parser.parse_sequence(b';A[test]', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b';A[test]')
+        self.parser.parse_sequence(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_multiple_nodes(self):
-        self.assertEqual(self.parser.parse_sequence(b';A[test];B[test];C[test]', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b';A[test];B[test];C[test]')
+        self.parser.parse_sequence(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
 
 class TestGameTree(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_single_sequence(self):
-        self.assertEqual(self.parser.parse_game_tree(b'(;A[test];B[test];C[test])', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b'(;A[test];B[test];C[test])')
+        self.parser.parse_game_tree(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_single_variation(self):
-        self.assertEqual(self.parser.parse_game_tree(b'(;A[test](;B[test];C[test]))', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b'(;A[test](;B[test];C[test]))')
+        self.parser.parse_game_tree(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_variations(self):
-        self.assertEqual(self.parser.parse_game_tree(b'(;A[test](;B[test])(;C[test]))', tianyuan.gametree.DotFileBuilder()), b'')
+        self.parser.reset(b'(;A[test](;B[test])(;C[test]))')
+        self.parser.parse_game_tree(tianyuan.gametree.GameTreeBuilder())
+        self.assertEqual(self.parser.get_remaining_data(), b'')
     def test_sequence_after_variation(self):
+        self.parser.reset(b'(;A[test](;B[test]);C[test])')
         with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
-            self.parser.parse_game_tree(b'(;A[test](;B[test]);C[test])', tianyuan.gametree.DotFileBuilder())
+            self.parser.parse_game_tree(tianyuan.gametree.GameTreeBuilder())
         self.assertEqual(cm.exception.position, 19)
 
 class TestCollection(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, validation = 'structural')
     def test_single_game_tree(self):
         self.assertEqual(len(self.parser.parse_collection(b'(;A[test];B[test];C[test])')), 1)
     def test_multiple_game_trees(self):
@@ -101,15 +144,249 @@ class TestCollection(unittest.TestCase):
 
 class TestHelpers(unittest.TestCase):
     def setUp(self):
-        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.DotFileBuilder)
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
     def test_parse_file(self):
         self.parser.parse_file('tests/test.sgf')
     def test_skipping_whitespace(self):
-        pass
+        self.parser.reset(b' \n \t test')
+        self.parser.skip_whitespace()
+        self.assertEqual(self.parser.bytes_consumed, 5)
+        self.assertEqual(self.parser.get_remaining_data(), b'test')
+    def test_find_property_value_end(self):
+        self.parser.reset(b'[a\\]b\\\\]c]')
+        self.assertEqual(self.parser.find_property_value_end(1), 7)
+        self.parser.reset(b'[a\\]')
+        self.assertEqual(self.parser.find_property_value_end(1), -1)
+    def test_multiple_values_in_one_match(self):
+        self.parser.reset(b' AB [aa] [b\\]b]\n[cc] ;')
+        self.assertEqual(self.parser.parse_property(), ('AB', [b'aa', b'b]b', b'cc']))
+        self.assertEqual(self.parser.get_remaining_data(), b';')
+    def test_composed_escapes(self):
+        self.parser.reset(b'AP[foo\\:bar\\\\:1\\]0]C[a\\:b]')
+        self.assertEqual(self.parser.parse_property(), ('AP', [b'foo\\:bar\\\\:1]0']))
+        self.assertEqual(self.parser.parse_property(), ('C', [b'a:b']))
+        self.assertEqual(tianyuan.sgfparser.split_composed_value(b'foo\\:bar\\\\:1]0'), (b'foo:bar\\', b'1]0'))
+        self.assertIsNone(tianyuan.sgfparser.split_composed_value(b'foo\\:bar'))
     def test_not_skipping_chars(self):
-        pass
+        self.parser.reset(b'test ')
+        self.parser.skip_whitespace()
+        self.assertEqual(self.parser.bytes_consumed, 0)
     def test_consume_single_byte(self):
-        pass
+        self.parser.reset(b'test')
+        self.parser.consume(1)
+        self.assertEqual(self.parser.get_remaining_data(), b'est')
     def test_consume_multiple_bytes(self):
-        pass
+        self.parser.reset(b'test')
+        self.parser.consume(3)
+        self.assertEqual(self.parser.get_remaining_data(), b't')
+    def test_soft_line_break(self):
+        self.parser.reset(b'[te\\\r\nst]')
+        self.assertEqual(self.parser.parse_property_value(), b'test')
+    def test_linear_scan(self):
+        sgf_data = b'(;C[' + b'a' * 1000000 + b'];B[aa])'
+        self.assertEqual(len(self.parser.parse_collection(sgf_data)), 1)
 
+
+class TestIterCollection(unittest.TestCase):
+    def setUp(self):
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, validation = 'structural')
+    def test_single_game_tree(self):
+        game_trees = list(self.parser.iter_collection(io.BytesIO(b'(;A[test];B[test];C[test])')))
+        self.assertEqual(len(game_trees), 1)
+    def test_multiple_game_trees(self):
+        sgf_file = io.BytesIO(b'(;A[test](;C[)(\\]])(;C[test]))\n(;A[a\\\\](;B[aa])(;C[test]))\n')
+        game_trees = list(self.parser.iter_collection(sgf_file, chunk_size = 3))
+        self.assertEqual(len(game_trees), 2)
+        self.assertEqual(game_trees[0].get_children(game_trees[0].get_root())[0].properties['C'], [b')(]'])
+        self.assertEqual(game_trees[1].get_root().properties['A'], [b'a\\'])
+    def test_yields_lazily(self):
+        game_trees = self.parser.iter_collection(io.BytesIO(b'(;A[test])(;A[test])test'))
+        next(game_trees)
+        next(game_trees)
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
+            next(game_trees)
+        self.assertEqual(cm.exception.position, 20)
+    def test_unterminated_game_tree(self):
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
+            list(self.parser.iter_collection(io.BytesIO(b'(;A[test])(;A[test](;B[test])'), chunk_size = 4))
+        self.assertEqual(cm.exception.position, 29)
+    def test_empty_file(self):
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
+            list(self.parser.iter_collection(io.BytesIO(b' \n')))
+        self.assertEqual(cm.exception.position, 2)
+    def test_path(self):
+        self.assertEqual(len(list(self.parser.iter_collection('tests/test.sgf'))), 1)
+
+class TestLazyValues(unittest.TestCase):
+    def setUp(self):
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, lazy = True)
+        self.game_tree = self.parser.parse_collection(b'(;SZ[9]C[long\\]\\\ncomment];B[ab]AB[cd][ef])')[0]
+    def test_values_are_not_decoded(self):
+        values = self.game_tree.get_root().properties['C']
+        self.assertIsNone(values.values)
+        self.assertEqual(len(values), 1)
+        self.assertIsNone(values.values)
+    def test_values_are_decoded_on_access(self):
+        values = self.game_tree.get_root().properties['C']
+        self.assertEqual(values[0], 'long]comment')
+        self.assertEqual(values.values, ['long]comment'])
+    def test_values_are_validated_on_access(self):
+        node = self.game_tree.get_children(self.game_tree.get_root())[0]
+        self.assertEqual(node.properties['B'], [(0, 1)])
+        self.assertEqual(node.properties['AB'], [(2, 3), (4, 5)])
+    def test_root_properties(self):
+        self.assertEqual(self.game_tree.get_root_property('SZ'), [9])
+        self.assertEqual(self.game_tree.get_root_property('CA'), ['iso-8859-1'])
+
+class TestNonASCIIInput(unittest.TestCase):
+    def setUp(self):
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+    def test_byte_order_mark(self):
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
+            self.parser.parse_collection(b'\xef\xbb\xbf(;B[aa])')
+        self.assertEqual(cm.exception.position, 0)
+    def test_non_ascii_identifier(self):
+        self.parser.reset(b'\xc3\xa9[test]')
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
+            self.parser.parse_property_identifier()
+        self.assertEqual(cm.exception.position, 0)
+
+class TestRecovery(unittest.TestCase):
+    def setUp(self):
+        self.parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, recover = True)
+    def test_error_line_and_column(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as cm:
+            parser.parse_collection(b'(;A[test]\n;B[aa]\n  ;C[test')
+        self.assertEqual((cm.exception.position, cm.exception.line, cm.exception.column), (26, 3, 10))
+    def test_malformed_property(self):
+        collection = self.parser.parse_collection(b'(;A[test]\nbad[x]B[aa];Ab[test]C[test])')
+        self.assertEqual(len(collection), 1)
+        root = collection[0].get_root()
+        self.assertEqual(list(root.properties), ['A', 'B', 'SZ', 'CA'])
+        self.assertEqual(list(collection[0].get_children(root)[0].properties), ['C'])
+        self.assertEqual([(diagnostic.position, diagnostic.line, diagnostic.column) for diagnostic in self.parser.diagnostics], [(10, 2, 1), (23, 2, 14)])
+    def test_duplicate_property(self):
+        collection = self.parser.parse_collection(b'(;A[a]A[b])')
+        self.assertEqual(collection[0].get_root().properties['A'], [b'a'])
+        self.assertEqual(self.parser.diagnostics[0].message, 'Duplicate property in the same node.')
+    def test_sequence_after_variation(self):
+        collection = self.parser.parse_collection(b'(;A[test](;B[aa]);C[test](;W[bb]))(;A[test])')
+        self.assertEqual(len(collection), 2)
+        self.assertEqual(len(collection[0].get_children(collection[0].get_root())), 2)
+        self.assertEqual(self.parser.diagnostics[0].position, 17)
+    def test_unterminated_game_tree(self):
+        collection = self.parser.parse_collection(b'(;A[test](;B[aa];W[bb')
+        self.assertEqual(len(collection), 1)
+        self.assertEqual([diagnostic.message for diagnostic in self.parser.diagnostics], ['Expected "]" while parsing property value.', 'Expected ")" while parsing game tree.', 'Expected ")" while parsing game tree.'])
+    def test_leading_junk(self):
+        for sgf_data in [b'x(;B[aa])', b')(;B[aa])']:
+            collection = self.parser.parse_collection(sgf_data + b'junk(;W[bb])')
+            self.assertEqual([list(game_tree.get_root().properties)[0] for game_tree in collection], ['B', 'W'])
+            self.assertEqual([(diagnostic.position, diagnostic.message) for diagnostic in self.parser.diagnostics], [(0, 'Expected "(" while parsing game tree.'), (9, 'Expected end-of-file while parsing collection.')])
+            self.assertEqual(len(list(self.parser.iter_collection(io.BytesIO(sgf_data + b'junk(;W[bb])')))), 2)
+            self.assertEqual([(diagnostic.position, diagnostic.message) for diagnostic in self.parser.diagnostics], [(0, 'Expected "(" while parsing game tree.'), (9, 'Expected end-of-file while parsing collection.')])
+    def test_streaming(self):
+        game_trees = list(self.parser.iter_collection(io.BytesIO(b'junk(;A[test])\n(;B[aa]x)junk'), chunk_size = 4))
+        self.assertEqual(len(game_trees), 2)
+        self.assertEqual([(diagnostic.position, diagnostic.line, diagnostic.column) for diagnostic in self.parser.diagnostics], [(0, 1, 1), (22, 2, 8), (24, 2, 10)])
+
+class TestDeepRecords(unittest.TestCase):
+    def test_long_main_line(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+        game_tree = parser.parse_collection(b'(;SZ[19]' + b';B[aa];W[bb]' * 5000 + b')')[0]
+        self.assertEqual(len(list(game_tree.iter_main_line())), 10001)
+    def test_nested_variations(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.CompactGameTreeBuilder)
+        game_tree = parser.parse_collection(b'(;SZ[19]' + b'(;B[aa];W[bb]' * 5000 + b')' * 5001)[0]
+        self.assertEqual(len(list(game_tree.iter_preorder())), 10001)
+
+class EventBuilder:
+    def __init__(self):
+        self.events = []
+    def start_variation(self):
+        self.events.append('(')
+    def end_variation(self):
+        self.events.append(')')
+    def start_node(self):
+        self.events.append(';')
+    def add_property(self, identifier, values):
+        self.events.append((identifier, list(values)))
+    def end_node(self):
+        self.events.append('.')
+    def get_game_tree(self):
+        return None
+
+class TestEvents(unittest.TestCase):
+    def test_events(self):
+        parser = tianyuan.sgfparser.SGFParser(EventBuilder)
+        builder = EventBuilder()
+        parser.reset(b'(;A[a]B[b][c](;C[d]))')
+        parser.parse_game_tree(builder)
+        self.assertEqual(builder.events, ['(', ';', ('A', [b'a']), ('B', [b'b', b'c']), '.', '(', ';', ('C', [b'd']), '.', ')', ')'])
+    def test_property_filter(self):
+        parser = tianyuan.sgfparser.SGFParser(EventBuilder, properties = ['B', 'W'])
+        builder = EventBuilder()
+        parser.reset(b'(;SZ[9]C[skipped \\] value]GN[x];B[aa]LB[aa:1][bb:2];W[bb])')
+        parser.parse_game_tree(builder)
+        self.assertEqual(builder.events, ['(', ';', ('SZ', [b'9']), '.', ';', ('B', [b'aa']), '.', ';', ('W', [b'bb']), '.', ')'])
+    def test_property_filter_game_tree(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, properties = ['B', 'W'])
+        game_tree = parser.parse_collection(b'(;SZ[9]C[comment];B[cc]C[x];W[dd])')[0]
+        self.assertEqual([dict(game_tree.get_properties(node)) for node in game_tree.iter_main_line()], [{'SZ': [9], 'CA': ['iso-8859-1']}, {'B': [(2, 2)]}, {'W': [(3, 3)]}])
+
+class TestValidation(unittest.TestCase):
+    def parse(self, sgf_data, validation = 'full'):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, validation = validation)
+        return parser.parse_collection(sgf_data)[0]
+    def test_levels(self):
+        sgf_data = b'(;SZ[9]KM[6.5];B[cc])'
+        self.assertEqual(self.parse(sgf_data, 'none').get_root().properties, {'SZ': [b'9'], 'KM': [b'6.5']})
+        self.assertEqual(self.parse(sgf_data, 'structural').get_root().properties, {'SZ': [9], 'KM': [b'6.5'], 'CA': ['iso-8859-1']})
+        self.assertEqual(self.parse(sgf_data).get_root().properties, {'SZ': [9], 'KM': [6.5], 'CA': ['iso-8859-1']})
+    def test_unknown_level(self):
+        with self.assertRaises(ValueError):
+            tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, validation = 'some')
+    def test_charset(self):
+        game_tree = self.parse('(;CA[UTF-8]PB[Kō Iso]C[first\nsecond\tline])'.encode('utf-8'))
+        self.assertEqual(game_tree.get_root().properties['PB'], ['Kō Iso'])
+        self.assertEqual(game_tree.get_root().properties['C'], ['first\nsecond line'])
+    def test_value_types(self):
+        game_tree = self.parse(b'(;SZ[9:7]AB[aa:bb][ig]VW[]LB[cc:x\\:y]DO[]PL[W]GB[2])')
+        self.assertEqual(dict(game_tree.get_root().properties), {'SZ': [(9, 7)], 'CA': ['iso-8859-1'], 'AB': [(0, 0), (1, 0), (0, 1), (1, 1), (8, 6)], 'VW': [], 'LB': [((2, 2), 'x:y')], 'DO': [None], 'PL': ['W'], 'GB': [2]})
+        game_tree = self.parse(b'(;SZ[9]FG[];B[aa]FG[257:Figure\\: 1])')
+        self.assertEqual(game_tree.get_root_property('FG'), [None])
+        self.assertEqual(game_tree.get_children(game_tree.get_root())[0].properties['FG'], [(257, 'Figure: 1')])
+    def test_coordinate_off_the_board(self):
+        with self.assertRaises(tianyuan.sgfparser.SGFSemanticError):
+            self.parse(b'(;SZ[9];B[jj])')
+    def test_pass(self):
+        game_tree = self.parse(b'(;B[tt];W[])')
+        self.assertEqual(game_tree.get_children(game_tree.get_root())[0].properties['W'], [None])
+        self.assertEqual(game_tree.get_root().properties['B'], [None])
+
+class TestStats(unittest.TestCase):
+    def test_disabled(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder)
+        parser.parse_collection(b'(;SZ[9])')
+        self.assertIsNone(parser.stats)
+    def test_counters(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, stats = True)
+        parser.parse_collection(b'(;SZ[9]C[long comment];B[aa](;W[bb])(;W[cc]AB[dd][ee]))\n(;SZ[9])')
+        stats = parser.stats
+        self.assertEqual((stats.bytes, stats.game_trees, stats.nodes, stats.properties, stats.values, stats.variations, stats.errors), (64, 2, 5, 7, 8, 4, 0))
+        self.assertEqual((stats.largest_node, stats.largest_value), (20, 12))
+        self.assertGreater(stats.build_time, 0)
+        self.assertGreater(stats.validate_time, 0)
+    def test_callback(self):
+        collected = []
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, recover = True, stats_callback = collected.append)
+        list(parser.iter_collection(io.BytesIO(b'(;SZ[9];B[aa]x)(;SZ[9])')))
+        self.assertEqual(len(collected), 1)
+        self.assertEqual((collected[0].game_trees, collected[0].nodes, collected[0].errors), (2, 3, 1))
+        self.assertIs(parser.stats, collected[0])
+    def test_errors(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, stats = True)
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError):
+            parser.parse_collection(b'(;SZ[9];B[aa]')
+        self.assertEqual(parser.stats.errors, 1)
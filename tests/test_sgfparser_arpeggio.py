@@ -0,0 +1,70 @@
+import glob
+import importlib.util
+import io
+import os
+import unittest
+
+import tianyuan.gametree
+import tianyuan.sgfparser
+
+SGF_DATA = [
+    b'(;FF[4]SZ[19];B[pd];W[dp])',
+    b'(;SZ[9]C[a \\] b \\\\ c:\\\nd];B[cc](;W[gg]C[x])(;W[gc];B[cg](;W[ee])(;W[ff])))',
+    b' ( ;SZ[9]AB[aa][bb]\n[cc] ; W [dd] )\n(;SZ[13]GN[second])',
+]
+
+@unittest.skipUnless(importlib.util.find_spec('arpeggio'), 'arpeggio is not installed')
+class TestArpeggioBackend(unittest.TestCase):
+    def parse(self, sgf_data, backend, **options):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, backend = backend, **options)
+        return parser.parse_collection(sgf_data)
+    def get_shape(self, collection):
+        shapes = []
+        for game_tree in collection:
+            shapes.append([(game_tree.get_depth(node), game_tree.get_properties(node)) for node in game_tree.iter_preorder()])
+        return shapes
+    def assertSameCollection(self, sgf_data, **options):
+        expected = self.get_shape(self.parse(sgf_data, 'native', **options))
+        self.assertEqual(self.get_shape(self.parse(sgf_data, 'arpeggio', **options)), expected)
+    def test_literals(self):
+        for sgf_data in SGF_DATA:
+            self.assertSameCollection(sgf_data)
+    def test_files(self):
+        for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.sgf'))):
+            with open(filename, 'rb') as sgf_file:
+                sgf_data = sgf_file.read()
+            for validation in ['structural', 'full']:
+                self.assertSameCollection(sgf_data, validation = validation)
+    def test_stats(self):
+        for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.sgf'))):
+            with open(filename, 'rb') as sgf_file:
+                sgf_data = sgf_file.read()
+            counters = []
+            for backend in ['native', 'arpeggio']:
+                parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, stats = True, backend = backend)
+                parser.parse_collection(sgf_data)
+                counters.append({name: value for name, value in parser.stats.as_dict().items() if not name.endswith('_time')})
+            self.assertEqual(counters[1], counters[0], filename)
+            self.assertGreater(counters[1]['largest_node'], 0)
+    def test_iter_collection(self):
+        parser = tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, backend = 'arpeggio')
+        collection = list(parser.iter_collection(io.BytesIO(SGF_DATA[2])))
+        self.assertEqual([game_tree.get_root_property('SZ') for game_tree in collection], [[9], [13]])
+    def test_properties(self):
+        collection = self.parse(SGF_DATA[1], 'arpeggio', properties = ['B', 'W'])
+        self.assertEqual(collection[0].get_properties(collection[0].get_root()), {'SZ': [9], 'CA': ['iso-8859-1']})
+        self.assertSameCollection(SGF_DATA[1], properties = ['B', 'W'])
+    def test_error(self):
+        with self.assertRaises(tianyuan.sgfparser.SGFParserError) as context:
+            self.parse(b'(;SZ[9]\n;B[cc]W)', 'arpeggio')
+        self.assertEqual((context.exception.position, context.exception.line), (15, 2))
+    def test_duplicate_property(self):
+        with self.assertRaises(tianyuan.sgfparser.SGFSemanticError):
+            self.parse(b'(;SZ[9]B[aa]B[bb])', 'arpeggio')
+    def test_options(self):
+        for options in [{'lazy': True}, {'recover': True}, {'backend': 'yacc'}]:
+            with self.assertRaises(ValueError):
+                tianyuan.sgfparser.SGFParser(tianyuan.gametree.GameTreeBuilder, **dict({'backend': 'arpeggio'}, **options))
+
+if __name__ == '__main__':
+    unittest.main()
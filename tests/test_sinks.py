@@ -0,0 +1,66 @@
+import functools
+import glob
+import io
+import os
+import json
+import unittest
+
+import tianyuan.gametree
+import tianyuan.sgfparser
+import tianyuan.sinks
+
+SGF_DATA = b'(;SZ[9]C[a \\] b \\\\ c];B[cc](;W[gg])(;W[gc];B[]))'
+
+class TestSinks(unittest.TestCase):
+    def parse(self, builder_class, sgf_data):
+        parser = tianyuan.sgfparser.SGFParser(builder_class)
+        return parser.parse_collection(sgf_data)
+    def test_sgf_writer(self):
+        output = io.BytesIO()
+        self.assertEqual(self.parse(functools.partial(tianyuan.sinks.SGFWriter, output), SGF_DATA + b'\n(;SZ[13])'), [])
+        self.assertEqual(output.getvalue(), SGF_DATA + b'\n(;SZ[13])\n')
+    def test_round_trip(self):
+        output = io.BytesIO()
+        self.parse(functools.partial(tianyuan.sinks.SGFWriter, output), SGF_DATA)
+        self.assertEqual(self.parse(functools.partial(tianyuan.sinks.SGFWriter, io.BytesIO()), output.getvalue()), [])
+        first = self.parse(tianyuan.gametree.GameTreeBuilder, SGF_DATA)[0]
+        second = self.parse(tianyuan.gametree.GameTreeBuilder, output.getvalue())[0]
+        self.assertEqual([dict(first.get_properties(node)) for node in first.iter_preorder()], [dict(second.get_properties(node)) for node in second.iter_preorder()])
+    def test_composed_escapes(self):
+        sgf_data = b'(;AP[foo\\:bar:1.0]LB[aa:x\\\\:y\\]])\n'
+        output = io.BytesIO()
+        self.parse(functools.partial(tianyuan.sinks.SGFWriter, output), sgf_data)
+        self.assertEqual(output.getvalue(), sgf_data)
+        game_tree = self.parse(tianyuan.gametree.GameTreeBuilder, output.getvalue())[0]
+        self.assertEqual(game_tree.get_root_property('AP'), [('foo:bar', '1.0')])
+        self.assertEqual(game_tree.get_root_property('LB'), [((0, 0), 'x\\:y]')])
+    def test_round_trip_bundled_files(self):
+        for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.sgf'))):
+            with open(filename, 'rb') as sgf_file:
+                collection = self.parse(tianyuan.gametree.GameTreeBuilder, sgf_file.read())
+            output = io.BytesIO()
+            for game_tree in collection:
+                tianyuan.sinks.write_game_tree(game_tree, output)
+            written = self.parse(tianyuan.gametree.GameTreeBuilder, output.getvalue())
+            self.assertEqual([[dict(game_tree.get_properties(node)) for node in game_tree.iter_preorder()] for game_tree in written], [[dict(game_tree.get_properties(node)) for node in game_tree.iter_preorder()] for game_tree in collection], filename)
+    def test_write_composed_values(self):
+        sgf_data = b'(;SZ[9]AP[foo\\:bar:1.0]FG[257:Fig\\\\ 1]LB[aa:x\\:y]AR[aa:bb]LN[cc:dd]DO[])\n'
+        game_tree = self.parse(tianyuan.gametree.GameTreeBuilder, sgf_data)[0]
+        output = io.BytesIO()
+        tianyuan.sinks.write_game_tree(game_tree, output)
+        self.assertEqual(output.getvalue(), sgf_data.replace(b')', b'CA[iso-8859-1])'))
+    def test_dot_writer(self):
+        output = io.StringIO()
+        self.parse(functools.partial(tianyuan.sinks.DotWriter, output), SGF_DATA)
+        self.assertEqual(output.getvalue(), 'digraph game {\n    0 -> 1;\n    1 -> 2;\n    1 -> 3;\n    3 -> 4;\n}\n')
+    def test_json_lines_writer(self):
+        output = io.StringIO()
+        self.parse(functools.partial(tianyuan.sinks.JSONLinesWriter, output), SGF_DATA)
+        nodes = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([(node['node'], node['parent']) for node in nodes], [(0, None), (1, 0), (2, 1), (3, 1), (4, 3)])
+        self.assertEqual(nodes[0]['properties'], {'SZ': ['9'], 'C': ['a ] b \\ c']})
+    def test_write_game_tree(self):
+        game_tree = self.parse(tianyuan.gametree.CompactGameTreeBuilder, b'(;SZ[9:7]KM[6.5];B[cc](;W[])(;W[gc]))')[0]
+        output = io.BytesIO()
+        tianyuan.sinks.write_game_tree(game_tree, output)
+        self.assertEqual(output.getvalue(), b'(;SZ[9:7]KM[6.5]CA[iso-8859-1];B[cc](;W[])(;W[gc]))\n')
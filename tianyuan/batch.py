@@ -0,0 +1,84 @@
+import argparse
+import collections
+import concurrent.futures
+import glob
+import itertools
+import os
+import sys
+import tianyuan.gametree
+import tianyuan.sgfparser
+
+GameSummary = collections.namedtuple('GameSummary', ['filename', 'index', 'root_properties', 'node_count'])
+BatchError = collections.namedtuple('BatchError', ['filename', 'position', 'message'])
+BatchResult = collections.namedtuple('BatchResult', ['games', 'errors'])
+
+def find_sgf_files(pattern):
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '**', '*.sgf')
+    return sorted(filename for filename in glob.glob(pattern, recursive = True) if os.path.isfile(filename))
+
+def count_nodes(game_tree):
+    return sum(1 for _ in game_tree.iter_preorder())
+
+def summarize_game_tree(filename, index, game_tree):
+    root_properties = dict(game_tree.get_properties(game_tree.get_root()))
+    return GameSummary(filename, index, root_properties, count_nodes(game_tree))
+
+def parse_files(filenames, builder_class = tianyuan.gametree.GameTreeBuilder, summarize = True):
+    # runs inside the worker processes, so everything returned has to be picklable
+    games = []
+    errors = []
+    parser = tianyuan.sgfparser.SGFParser(builder_class)
+    for filename in filenames:
+        try:
+            collection = parser.parse_file(filename)
+        except tianyuan.sgfparser.SGFParserError as error:
+            errors.append(BatchError(filename, error.position, error.message))
+            continue
+        except tianyuan.sgfparser.SGFSemanticError as error:
+            errors.append(BatchError(filename, None, error.message))
+            continue
+        except (OSError, ValueError, RecursionError) as error:
+            errors.append(BatchError(filename, None, '{}: {}'.format(type(error).__name__, error)))
+            continue
+        for index, game_tree in enumerate(collection):
+            if summarize:
+                games.append(summarize_game_tree(filename, index, game_tree))
+            else:
+                games.append((filename, index, game_tree))
+    return games, errors
+
+def parse_batch(pattern, builder_class = tianyuan.gametree.GameTreeBuilder, summarize = True, workers = None, chunksize = 16):
+    filenames = find_sgf_files(pattern)
+    chunks = [filenames[start:start + chunksize] for start in range(0, len(filenames), chunksize)]
+    games = []
+    errors = []
+    if workers == 1:
+        results = map(parse_files, chunks, itertools.repeat(builder_class), itertools.repeat(summarize))
+        for chunk_games, chunk_errors in results:
+            games.extend(chunk_games)
+            errors.extend(chunk_errors)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+            results = executor.map(parse_files, chunks, itertools.repeat(builder_class), itertools.repeat(summarize))
+            for chunk_games, chunk_errors in results:
+                games.extend(chunk_games)
+                errors.extend(chunk_errors)
+    return BatchResult(games, errors)
+
+def main(arguments = None):
+    argument_parser = argparse.ArgumentParser(prog = 'python -m tianyuan.batch', description = 'Parse a directory or glob of SGF files in parallel.')
+    argument_parser.add_argument('pattern', help = 'directory (searched recursively for *.sgf) or glob pattern')
+    argument_parser.add_argument('-w', '--workers', type = int, default = None, help = 'number of worker processes (default: number of CPUs)')
+    argument_parser.add_argument('-c', '--chunksize', type = int, default = 16, help = 'number of files handed to a worker at once')
+    arguments = argument_parser.parse_args(arguments)
+    result = parse_batch(arguments.pattern, workers = arguments.workers, chunksize = arguments.chunksize)
+    for summary in result.games:
+        print('{}\t{}\t{}'.format(summary.filename, summary.index, summary.node_count))
+    for error in result.errors:
+        print('{}:{}: {}'.format(error.filename, error.position, error.message), file = sys.stderr)
+    print('{} games, {} errors'.format(len(result.games), len(result.errors)), file = sys.stderr)
+    return 1 if result.errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
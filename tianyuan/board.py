@@ -0,0 +1,202 @@
+import functools
+import random
+
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+
+COLOURS = {'B': BLACK, 'W': WHITE}
+COORDINATES = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+def opponent(colour):
+    return BLACK + WHITE - colour
+
+@functools.lru_cache(maxsize = None)
+def zobrist_table(columns, rows, seed = 0x7479):
+    # deterministic, so hashes are comparable between runs and processes; seeded per
+    # board size, with the last key hashing the size into the empty board as well
+    generator = random.Random('{}:{}x{}'.format(seed, columns, rows))
+    return tuple(generator.getrandbits(64) for _ in range(2 * columns * rows + 1))
+
+class Board:
+    # stones are kept in a flat bytearray indexed by x + y * columns; every change
+    # is journaled per node so a variation can be left again with undo()
+    def __init__(self, columns = 19, rows = None, track_symmetries = False):
+        self.columns = columns
+        self.rows = columns if rows is None else rows
+        self.points = bytearray(self.columns * self.rows)
+        self.neighbours = [self.get_neighbours(point) for point in range(len(self.points))]
+        self.zobrist = zobrist_table(self.columns, self.rows)
+        self.empty_hash = self.zobrist[-1]
+        self.hash = self.empty_hash
+        self.history = []
+        # optionally keep one hash per board symmetry and colour swap up to date as well
+        self.symmetries = self.get_symmetries() if track_symmetries else None
+        self.symmetry_hashes = [self.empty_hash] * (2 * len(self.symmetries)) if track_symmetries else None
+    @classmethod
+    def from_game_tree(cls, game_tree, track_symmetries = False):
+        properties = game_tree.get_properties(game_tree.get_root())
+        board_size = properties['SZ'][0] if 'SZ' in properties else 19
+        if isinstance(board_size, (bytes, str)):
+            board_size = board_size.decode('ascii') if isinstance(board_size, bytes) else board_size
+            board_size = tuple(int(part) for part in board_size.split(':')) if ':' in board_size else int(board_size)
+        if isinstance(board_size, tuple):
+            return cls(board_size[0], board_size[1], track_symmetries)
+        return cls(board_size, track_symmetries = track_symmetries)
+    def get_neighbours(self, point):
+        x, y = point % self.columns, point // self.columns
+        neighbours = []
+        if x > 0:
+            neighbours.append(point - 1)
+        if x < self.columns - 1:
+            neighbours.append(point + 1)
+        if y > 0:
+            neighbours.append(point - self.columns)
+        if y < self.rows - 1:
+            neighbours.append(point + self.columns)
+        return tuple(neighbours)
+    def get_symmetries(self):
+        # point permutations for the rotations and reflections that map the board onto itself
+        transforms = [lambda x, y: (x, y), lambda x, y: (self.columns - 1 - x, y), lambda x, y: (x, self.rows - 1 - y), lambda x, y: (self.columns - 1 - x, self.rows - 1 - y)]
+        if self.columns == self.rows:
+            transforms += [lambda x, y: (y, x), lambda x, y: (self.rows - 1 - y, x), lambda x, y: (y, self.columns - 1 - x), lambda x, y: (self.rows - 1 - y, self.columns - 1 - x)]
+        symmetries = []
+        for transform in transforms:
+            symmetry = []
+            for point in range(len(self.points)):
+                x, y = transform(point % self.columns, point // self.columns)
+                symmetry.append(x + y * self.columns)
+            symmetries.append(symmetry)
+        return symmetries
+    def get_canonical_hash(self):
+        # smallest hash over all symmetries and the colour swap
+        if self.symmetry_hashes is not None:
+            return min(self.symmetry_hashes)
+        symmetries = self.get_symmetries()
+        symmetry_hashes = [self.empty_hash] * (2 * len(symmetries))
+        for point, colour in enumerate(self.points):
+            if colour:
+                self.update_symmetry_hashes(symmetry_hashes, symmetries, point, colour)
+        return min(symmetry_hashes)
+    def update_symmetry_hashes(self, symmetry_hashes, symmetries, point, colour):
+        swapped_offset = len(symmetries)
+        for index, symmetry in enumerate(symmetries):
+            symmetric_point = 2 * symmetry[point]
+            symmetry_hashes[index] ^= self.zobrist[symmetric_point + colour - 1]
+            symmetry_hashes[swapped_offset + index] ^= self.zobrist[symmetric_point + opponent(colour) - 1]
+    def get_point(self, coordinate):
+        x, y = coordinate
+        if not (0 <= x < self.columns and 0 <= y < self.rows):
+            raise ValueError('Coordinate {} is not on the board.'.format(coordinate))
+        return x + y * self.columns
+    def get(self, coordinate):
+        return self.points[self.get_point(coordinate)]
+    def get_stones(self, colour):
+        return [(point % self.columns, point // self.columns) for point, point_colour in enumerate(self.points) if point_colour == colour]
+    def to_points(self, value):
+        # accepts validated coordinates as well as raw (possibly compressed) SGF values
+        if value is None:
+            return []
+        if isinstance(value, tuple):
+            return [self.get_point(value)]
+        if isinstance(value, bytes):
+            value = value.decode('ascii')
+        if value == '' or (value == 'tt' and self.columns <= 19 and self.rows <= 19):
+            return []
+        if ':' in value:
+            first, second = value.split(':')
+            first_x, first_y = COORDINATES.index(first[0]), COORDINATES.index(first[1])
+            second_x, second_y = COORDINATES.index(second[0]), COORDINATES.index(second[1])
+            return [self.get_point((x, y)) for y in range(min(first_y, second_y), max(first_y, second_y) + 1) for x in range(min(first_x, second_x), max(first_x, second_x) + 1)]
+        return [self.get_point((COORDINATES.index(value[0]), COORDINATES.index(value[1])))]
+    def set_point(self, point, colour):
+        old_colour = self.points[point]
+        if old_colour == colour:
+            return
+        if old_colour:
+            self.hash ^= self.zobrist[2 * point + old_colour - 1]
+        if colour:
+            self.hash ^= self.zobrist[2 * point + colour - 1]
+        if self.symmetry_hashes is not None:
+            if old_colour:
+                self.update_symmetry_hashes(self.symmetry_hashes, self.symmetries, point, old_colour)
+            if colour:
+                self.update_symmetry_hashes(self.symmetry_hashes, self.symmetries, point, colour)
+        self.points[point] = colour
+        # changes made outside of begin_node() are not journaled and cannot be undone
+        if self.history:
+            self.history[-1].append((point, old_colour))
+    def get_group(self, point):
+        # flood fill over one group, so the cost is proportional to the stones it touches
+        colour = self.points[point]
+        group = [point]
+        seen = {point}
+        has_liberties = False
+        for stone in group:
+            for neighbour in self.neighbours[stone]:
+                neighbour_colour = self.points[neighbour]
+                if neighbour_colour == EMPTY:
+                    has_liberties = True
+                elif neighbour_colour == colour and neighbour not in seen:
+                    seen.add(neighbour)
+                    group.append(neighbour)
+        return group, has_liberties
+    def begin_node(self):
+        self.history.append([(self.hash, None if self.symmetry_hashes is None else list(self.symmetry_hashes))])
+    def undo(self):
+        changes = self.history.pop()
+        for point, colour in reversed(changes[1:]):
+            self.points[point] = colour
+        self.hash, symmetry_hashes = changes[0]
+        if symmetry_hashes is not None:
+            self.symmetry_hashes = symmetry_hashes
+    def play(self, colour, point):
+        if point is None:
+            return 0
+        self.set_point(point, colour)
+        captured = 0
+        for neighbour in self.neighbours[point]:
+            if self.points[neighbour] == opponent(colour):
+                group, has_liberties = self.get_group(neighbour)
+                if not has_liberties:
+                    captured += len(group)
+                    for stone in group:
+                        self.set_point(stone, EMPTY)
+        group, has_liberties = self.get_group(point)
+        if not has_liberties:
+            # suicide removes the own group
+            for stone in group:
+                self.set_point(stone, EMPTY)
+        return captured
+    def apply_node(self, properties):
+        self.begin_node()
+        for identifier, colour in [('AE', EMPTY), ('AB', BLACK), ('AW', WHITE)]:
+            if identifier in properties:
+                for value in properties[identifier]:
+                    for point in self.to_points(value):
+                        self.set_point(point, colour)
+        for identifier, colour in COLOURS.items():
+            if identifier in properties:
+                for point in self.to_points(properties[identifier][0]):
+                    self.play(colour, point)
+
+def replay(game_tree, path):
+    board = Board.from_game_tree(game_tree)
+    for node in path:
+        board.apply_node(game_tree.get_properties(node))
+    return board
+
+def iter_positions(game_tree, track_symmetries = False):
+    # walks all variations in pre-order and leaves each one by undoing its moves,
+    # so no position is replayed from the root; the yielded board is reused
+    board = Board.from_game_tree(game_tree, track_symmetries)
+    stack = [(game_tree.get_root(), False)]
+    while stack:
+        node, leaving = stack.pop()
+        if leaving:
+            board.undo()
+            continue
+        board.apply_node(game_tree.get_properties(node))
+        yield node, board
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(game_tree.get_children(node)))
@@ -0,0 +1,173 @@
+import collections
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import tianyuan.gametree
+
+MAGIC = b'TYC2'
+# magic, source size, source mtime in nanoseconds, SHA-1 of the source, validation level,
+# whether the games were stored validated, number of games
+FILE_HEADER = struct.Struct('<4sQQ20s12s?I')
+# nodes, properties, identifiers, size of the marshalled property values
+GAME_HEADER = struct.Struct('<IIII')
+# arrays of a CompactGameTree that are stored as they are, with one entry per node
+NODE_ARRAYS = ['parent', 'first_child', 'last_child', 'next_sibling', 'previous_sibling', 'depth', 'variation_index', 'main_line']
+
+CachedCollection = collections.namedtuple('CachedCollection', ['size', 'validated', 'records'])
+
+class RecordingBuilder:
+    # passes builder events on unchanged and records the raw game tree next to them, for
+    # builders that keep no tree of their own
+    def __init__(self, builder):
+        self.builder = builder
+        self.recorder = tianyuan.gametree.CompactGameTreeBuilder()
+    @property
+    def record(self):
+        return self.recorder.get_game_tree()
+    def start_variation(self):
+        self.recorder.start_variation()
+        self.builder.start_variation()
+    def end_variation(self):
+        self.recorder.end_variation()
+        self.builder.end_variation()
+    def start_node(self):
+        self.recorder.start_node()
+        self.builder.start_node()
+    def add_property(self, identifier, values):
+        self.recorder.add_property(identifier, list(values))
+        self.builder.add_property(identifier, values)
+    def end_node(self):
+        self.recorder.end_node()
+        self.builder.end_node()
+    def get_game_tree(self):
+        return self.builder.get_game_tree()
+
+def record_game_tree(game_tree):
+    # records are compact game trees numbered in pre-order, whatever tree they were made from
+    record = tianyuan.gametree.CompactGameTree()
+    indexes = {}
+    for node in game_tree.iter_preorder():
+        record_node = tianyuan.gametree.GameTreeNode()
+        record_node.properties.update(game_tree.get_properties(node))
+        parent = game_tree.get_parent(node)
+        indexes[node] = record.add_node(record_node, None if parent is None else indexes[parent])
+    return record
+
+def build_game_tree(record, builder):
+    # replays a record as builder events, opening a variation wherever a node has siblings
+    builder.start_variation()
+    stack = [('node', record.get_root())] if record.get_root() is not None else []
+    while stack:
+        event, node = stack.pop()
+        if event == 'end':
+            builder.end_variation()
+            continue
+        if event == 'start':
+            builder.start_variation()
+            stack.append(('end', None))
+        builder.start_node()
+        for identifier, values in record.get_properties(node).items():
+            builder.add_property(identifier, values)
+        builder.end_node()
+        children = record.get_children(node)
+        if len(children) == 1:
+            stack.append(('node', children[0]))
+        else:
+            stack.extend(('start', child) for child in reversed(children))
+    builder.end_variation()
+    return builder
+
+def load_game_tree(record, builder):
+    # validated records become trees of the plain builders directly, anything else is replayed
+    if type(builder) is tianyuan.gametree.CompactGameTreeBuilder:
+        return record
+    if type(builder) is tianyuan.gametree.GameTreeBuilder:
+        return tianyuan.gametree.GameTree.from_compact(record)
+    return build_game_tree(record, builder).get_game_tree()
+
+def encode_game_tree(record):
+    identifier_table = b''.join(struct.pack('<B', len(identifier)) + identifier.encode('ascii') for identifier in record.identifiers)
+    property_values = marshal.dumps(record.property_values)
+    arrays = [getattr(record, name) for name in NODE_ARRAYS] + [record.property_start, record.property_identifiers, record.property_single]
+    return b''.join([GAME_HEADER.pack(len(record.parent), len(record.property_identifiers), len(record.identifiers), len(property_values)), identifier_table] + [values.tobytes() for values in arrays] + [property_values])
+
+def read_array(values, data, offset, count):
+    values.frombytes(data[offset:offset + count * values.itemsize])
+    return offset + count * values.itemsize
+
+def decode_game_tree(data, offset):
+    node_count, property_count, identifier_count, values_size = GAME_HEADER.unpack_from(data, offset)
+    offset += GAME_HEADER.size
+    record = tianyuan.gametree.CompactGameTree()
+    for _ in range(identifier_count):
+        length = data[offset]
+        record.get_identifier_index(data[offset + 1:offset + 1 + length].decode('ascii'))
+        offset += 1 + length
+    for name in NODE_ARRAYS:
+        offset = read_array(getattr(record, name), data, offset, node_count)
+    del record.property_start[:]
+    offset = read_array(record.property_start, data, offset, node_count + 1)
+    offset = read_array(record.property_identifiers, data, offset, property_count)
+    offset = read_array(record.property_single, data, offset, property_count)
+    record.property_values = marshal.loads(data[offset:offset + values_size])
+    return record, offset + values_size
+
+class GameTreeCache:
+    # one cache file per source path, evicted least recently used first once max_size is exceeded
+    def __init__(self, directory, max_size = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok = True)
+    def get_cache_filename(self, filename):
+        return os.path.join(self.directory, hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest() + '.tyc')
+    def load(self, filename, validation):
+        cache_filename = self.get_cache_filename(filename)
+        try:
+            source_stat = os.stat(filename)
+            cache_file = open(cache_filename, 'rb')
+        except OSError:
+            return None
+        with cache_file:
+            if os.fstat(cache_file.fileno()).st_size < FILE_HEADER.size:
+                return None
+            with mmap.mmap(cache_file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                magic, size, mtime, content_hash, stored_validation, validated, game_count = FILE_HEADER.unpack_from(data, 0)
+                if magic != MAGIC or size != source_stat.st_size or stored_validation.rstrip(b'\0') != validation.encode('ascii'):
+                    return None
+                if mtime != source_stat.st_mtime_ns:
+                    # touched but possibly unchanged, fall back to comparing the content
+                    with open(filename, 'rb') as sgf_file:
+                        if hashlib.sha1(sgf_file.read()).digest() != content_hash:
+                            return None
+                records = []
+                offset = FILE_HEADER.size
+                for _ in range(game_count):
+                    record, offset = decode_game_tree(data, offset)
+                    records.append(record)
+        # mark as recently used
+        os.utime(cache_filename)
+        return CachedCollection(size, validated, records)
+    def store(self, filename, source_stat, sgf_data, validation, validated, records):
+        cache_filename = self.get_cache_filename(filename)
+        temporary_filename = cache_filename + '.tmp'
+        with open(temporary_filename, 'wb') as cache_file:
+            cache_file.write(FILE_HEADER.pack(MAGIC, source_stat.st_size, source_stat.st_mtime_ns, hashlib.sha1(sgf_data).digest(), validation.encode('ascii'), validated, len(records)))
+            for record in records:
+                cache_file.write(encode_game_tree(record))
+        os.replace(temporary_filename, cache_filename)
+        self.evict()
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tyc'):
+                path = os.path.join(self.directory, name)
+                entry_stat = os.stat(path)
+                entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
@@ -1,62 +1,379 @@
+import array
 import collections
+import collections.abc
 
 class GameTreeNode:
     def __init__(self):
         self.properties = collections.OrderedDict()
 
 class GameTree:
+    # parents, depths, variation indexes and main line membership are recorded as
+    # nodes are added; pre-order intervals are computed on first use after a change
     def __init__(self):
         self.root = None
         self.children = {}
+        self.parents = {}
+        self.depths = {}
+        self.variation_indexes = {}
+        self.main_line = {}
+        self.intervals = None
+    @classmethod
+    def from_compact(cls, compact_game_tree):
+        # converts a compact game tree without removed nodes, filling the indexes in bulk
+        game_tree = cls()
+        nodes = [GameTreeNode() for _ in compact_game_tree.parent]
+        if not nodes:
+            return game_tree
+        identifiers = compact_game_tree.identifiers
+        names = [identifiers[index] for index in compact_game_tree.property_identifiers]
+        values = [[value] if single else value for single, value in zip(compact_game_tree.property_single, compact_game_tree.property_values)]
+        property_start = compact_game_tree.property_start
+        owners = []
+        for node, start, end in zip(nodes, property_start, property_start[1:]):
+            owners += [node.properties] * (end - start)
+        for properties, identifier, node_values in zip(owners, names, values):
+            properties[identifier] = node_values
+        for index, extra_properties in compact_game_tree.extra_properties.items():
+            nodes[index].properties.update(extra_properties)
+        parents = [None] + [nodes[parent] for parent in compact_game_tree.parent[1:]]
+        for node, parent in zip(nodes[1:], parents[1:]):
+            game_tree.children.setdefault(parent, []).append(node)
+        game_tree.root = nodes[0]
+        game_tree.parents = dict(zip(nodes, parents))
+        game_tree.depths = dict(zip(nodes, compact_game_tree.depth))
+        game_tree.variation_indexes = dict(zip(nodes, compact_game_tree.variation_index))
+        game_tree.main_line = dict(zip(nodes, map(bool, compact_game_tree.main_line)))
+        return game_tree
     def add_node(self, node, parent = None):
-        if parent:
-            self.children.setdefault(parent, []).append(node)
+        if parent is not None:
+            siblings = self.children.setdefault(parent, [])
+            self.variation_indexes[node] = len(siblings)
+            siblings.append(node)
+            self.depths[node] = self.depths[parent] + 1
+            self.main_line[node] = self.main_line[parent] and not self.variation_indexes[node]
         else:
             self.root = node
+            self.variation_indexes[node] = 0
+            self.depths[node] = 0
+            self.main_line[node] = True
+        self.parents[node] = parent
+        self.intervals = None
+        return node
     def remove_node(self, node):
-        del(self.children[node])
+        # cuts off the variations below node
+        for child in self.children.pop(node, ()):
+            for descendant in list(self.iter_preorder(child)):
+                self.children.pop(descendant, None)
+                for index in (self.parents, self.depths, self.variation_indexes, self.main_line):
+                    del index[descendant]
+        self.intervals = None
     def get_root(self):
         return self.root
     def get_children(self, node):
-        return self.children.setdefault(node, [])
+        return self.children.get(node, [])
+    def get_parent(self, node):
+        return self.parents[node]
+    def get_depth(self, node):
+        return self.depths[node]
+    def get_variation_index(self, node):
+        return self.variation_indexes[node]
+    def is_on_main_line(self, node):
+        return self.main_line[node]
+    def get_next_sibling(self, node):
+        parent = self.parents[node]
+        if parent is None:
+            return None
+        siblings = self.children[parent]
+        index = self.variation_indexes[node] + 1
+        return siblings[index] if index < len(siblings) else None
+    def get_previous_sibling(self, node):
+        parent = self.parents[node]
+        index = self.variation_indexes[node]
+        return self.children[parent][index - 1] if parent is not None and index else None
+    def iter_siblings(self, node):
+        # all children of the node's parent, the node itself included
+        parent = self.parents[node]
+        if parent is None:
+            yield node
+            return
+        yield from self.children[parent]
+    def get_path(self, node):
+        path = [None] * (self.depths[node] + 1)
+        while node is not None:
+            path[self.depths[node]] = node
+            node = self.parents[node]
+        return path
+    def get_move_number(self, node):
+        return sum(1 for path_node in self.get_path(node) if 'B' in self.get_properties(path_node) or 'W' in self.get_properties(path_node))
+    def get_intervals(self):
+        # pre-order number of each node and one past the pre-order number of its last descendant
+        if self.intervals is None:
+            order = list(self.iter_preorder())
+            enter = {node: index for index, node in enumerate(order)}
+            exit = {}
+            for node in reversed(order):
+                children = self.children.get(node)
+                exit[node] = exit[children[-1]] if children else enter[node] + 1
+            self.intervals = enter, exit
+        return self.intervals
+    def is_ancestor(self, ancestor, node):
+        enter, exit = self.get_intervals()
+        return enter[ancestor] <= enter[node] < exit[ancestor]
+    def get_subtree_size(self, node):
+        enter, exit = self.get_intervals()
+        return exit[node] - enter[node]
+    def iter_preorder(self, node = None):
+        node = self.root if node is None else node
+        if node is None:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(self.children.get(node, ())))
+    def iter_main_line(self, node = None):
+        node = self.root if node is None else node
+        while node is not None:
+            yield node
+            children = self.children.get(node)
+            node = children[0] if children else None
+    def get_properties(self, node):
+        return node.properties
+    def set_property(self, node, identifier, values):
+        node.properties[identifier] = values
     def set_root_property(self, identifier, values):
         self.root.properties[identifier] = values
     def get_root_property(self, identifier):
         return self.root.properties[identifier]
 
+class CompactProperties(collections.abc.Mapping):
+    # mapping view over the property span of one node in a CompactGameTree; the
+    # value lists it returns are rebuilt on access, so writes have to go through
+    # item assignment (or CompactGameTree.set_property) to be kept
+    __slots__ = ('game_tree', 'node')
+    def __init__(self, game_tree, node):
+        self.game_tree = game_tree
+        self.node = node
+    def __getitem__(self, identifier):
+        return self.game_tree.get_property(self.node, identifier)
+    def __setitem__(self, identifier, values):
+        self.game_tree.set_property(self.node, identifier, values)
+    def __iter__(self):
+        game_tree = self.game_tree
+        for index in range(game_tree.property_start[self.node], game_tree.property_start[self.node + 1]):
+            yield game_tree.identifiers[game_tree.property_identifiers[index]]
+        yield from game_tree.extra_properties.get(self.node, ())
+    def __len__(self):
+        game_tree = self.game_tree
+        return game_tree.property_start[self.node + 1] - game_tree.property_start[self.node] + len(game_tree.extra_properties.get(self.node, ()))
+    def __repr__(self):
+        return repr(dict(self))
+
+class CompactGameTree:
+    # nodes are integer handles into parallel arrays; the properties of all nodes
+    # live in flat arrays and node i owns the span property_start[i]:property_start[i + 1]
+    def __init__(self):
+        self.parent = array.array('i')
+        self.first_child = array.array('i')
+        self.last_child = array.array('i')
+        self.next_sibling = array.array('i')
+        self.previous_sibling = array.array('i')
+        self.depth = array.array('i')
+        self.variation_index = array.array('i')
+        self.main_line = array.array('b')
+        # pre-order intervals, computed on first use after a change
+        self.intervals = None
+        self.property_start = array.array('I', [0])
+        # identifiers are stored as indexes into a per-tree table
+        self.identifiers = []
+        self.identifier_indexes = {}
+        self.property_identifiers = array.array('H')
+        # single values are stored without their list, flagged in property_single
+        self.property_single = array.array('b')
+        self.property_values = []
+        self.extra_properties = {}
+    def add_node(self, node, parent = None):
+        index = len(self.parent)
+        if parent is None:
+            if index:
+                raise ValueError('Compact game tree already has a root.')
+            self.parent.append(-1)
+            self.previous_sibling.append(-1)
+            self.depth.append(0)
+            self.variation_index.append(0)
+            self.main_line.append(1)
+        else:
+            self.parent.append(parent)
+            previous_sibling = self.last_child[parent]
+            if previous_sibling < 0:
+                self.first_child[parent] = index
+            else:
+                self.next_sibling[previous_sibling] = index
+            self.last_child[parent] = index
+            self.previous_sibling.append(previous_sibling)
+            self.depth.append(self.depth[parent] + 1)
+            self.variation_index.append(0 if previous_sibling < 0 else self.variation_index[previous_sibling] + 1)
+            self.main_line.append(self.main_line[parent] and previous_sibling < 0)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        self.intervals = None
+        for identifier, values in node.properties.items():
+            self.property_identifiers.append(self.get_identifier_index(identifier))
+            self.append_values(values)
+        self.property_start.append(len(self.property_identifiers))
+        return index
+    def get_identifier_index(self, identifier):
+        if identifier not in self.identifier_indexes:
+            self.identifier_indexes[identifier] = len(self.identifiers)
+            self.identifiers.append(identifier)
+        return self.identifier_indexes[identifier]
+    def append_values(self, values):
+        if type(values) is list and len(values) == 1:
+            self.property_single.append(1)
+            self.property_values.append(values[0])
+        else:
+            self.property_single.append(0)
+            self.property_values.append(values)
+    def get_values(self, index):
+        if self.property_single[index]:
+            return [self.property_values[index]]
+        return self.property_values[index]
+    def remove_node(self, node):
+        # cuts off the variations below node, their slots in the arrays stay unused
+        self.first_child[node] = -1
+        self.last_child[node] = -1
+        self.intervals = None
+    def get_root(self):
+        return 0 if self.parent else None
+    def get_parent(self, node):
+        parent = self.parent[node]
+        return None if parent < 0 else parent
+    def get_depth(self, node):
+        return self.depth[node]
+    def get_variation_index(self, node):
+        return self.variation_index[node]
+    def is_on_main_line(self, node):
+        return bool(self.main_line[node])
+    def get_next_sibling(self, node):
+        sibling = self.next_sibling[node]
+        return None if sibling < 0 else sibling
+    def get_previous_sibling(self, node):
+        sibling = self.previous_sibling[node]
+        return None if sibling < 0 else sibling
+    def iter_siblings(self, node):
+        parent = self.parent[node]
+        sibling = node if parent < 0 else self.first_child[parent]
+        while sibling >= 0:
+            yield sibling
+            sibling = self.next_sibling[sibling]
+    def get_path(self, node):
+        path = [0] * (self.depth[node] + 1)
+        while node >= 0:
+            path[self.depth[node]] = node
+            node = self.parent[node]
+        return path
+    def get_move_number(self, node):
+        return sum(1 for path_node in self.get_path(node) if 'B' in self.get_properties(path_node) or 'W' in self.get_properties(path_node))
+    def get_intervals(self):
+        # pre-order number of each node and one past the pre-order number of its last descendant
+        if self.intervals is None:
+            enter = array.array('i', [-1]) * len(self.parent)
+            exit = array.array('i', [-1]) * len(self.parent)
+            order = list(self.iter_preorder())
+            for index, node in enumerate(order):
+                enter[node] = index
+            for node in reversed(order):
+                last_child = self.last_child[node]
+                exit[node] = exit[last_child] if last_child >= 0 else enter[node] + 1
+            self.intervals = enter, exit
+        return self.intervals
+    def is_ancestor(self, ancestor, node):
+        enter, exit = self.get_intervals()
+        return enter[ancestor] <= enter[node] < exit[ancestor]
+    def get_subtree_size(self, node):
+        enter, exit = self.get_intervals()
+        return exit[node] - enter[node]
+    def get_children(self, node):
+        children = []
+        child = self.first_child[node]
+        while child >= 0:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+    def iter_preorder(self, node = None):
+        # next sibling links double as the explicit stack: after a subtree is done,
+        # continue with the nearest ancestor's next sibling
+        node = self.get_root() if node is None else node
+        if node is None:
+            return
+        top = node
+        while True:
+            yield node
+            if self.first_child[node] >= 0:
+                node = self.first_child[node]
+                continue
+            while node != top and self.next_sibling[node] < 0:
+                node = self.parent[node]
+            if node == top:
+                return
+            node = self.next_sibling[node]
+    def iter_main_line(self, node = None):
+        node = self.get_root() if node is None else node
+        while node is not None and node >= 0:
+            yield node
+            node = self.first_child[node]
+    def get_properties(self, node):
+        return CompactProperties(self, node)
+    def get_property(self, node, identifier):
+        identifier_index = self.identifier_indexes.get(identifier)
+        if identifier_index is not None:
+            for index in range(self.property_start[node], self.property_start[node + 1]):
+                if self.property_identifiers[index] == identifier_index:
+                    return self.get_values(index)
+        return self.extra_properties.get(node, {})[identifier]
+    def set_property(self, node, identifier, values):
+        identifier_index = self.identifier_indexes.get(identifier)
+        for index in range(self.property_start[node], self.property_start[node + 1]):
+            if self.property_identifiers[index] == identifier_index:
+                if type(values) is list and len(values) == 1:
+                    self.property_single[index] = 1
+                    self.property_values[index] = values[0]
+                else:
+                    self.property_single[index] = 0
+                    self.property_values[index] = values
+                return
+        # the spans are packed, so properties added after the fact are kept aside
+        self.extra_properties.setdefault(node, collections.OrderedDict())[identifier] = values
+    def set_root_property(self, identifier, values):
+        self.set_property(self.get_root(), identifier, values)
+    def get_root_property(self, identifier):
+        return self.get_property(self.get_root(), identifier)
+
 class GameTreeBuilder:
+    # the parser calls start_node, add_property for each property and end_node;
+    # subclasses that only want whole nodes can override add_node instead
+    game_tree_class = GameTree
     def __init__(self):
-        self.game_tree = GameTree()
+        self.game_tree = self.game_tree_class()
         self.last_node = None
         self.variation_stack = []
+        self.node = None
     def start_variation(self):
         self.variation_stack.append(self.last_node)
     def end_variation(self):
         self.last_node = self.variation_stack.pop()
+    def start_node(self):
+        self.node = GameTreeNode()
+    def add_property(self, identifier, values):
+        self.node.properties[identifier] = values
+    def end_node(self):
+        self.add_node(self.node)
+        self.node = None
     def add_node(self, node):
-        self.game_tree.add_node(node, self.last_node)
-        self.last_node = node
+        self.last_node = self.game_tree.add_node(node, self.last_node)
     def get_game_tree(self):
         return self.game_tree
-        
-class DotFileBuilder(GameTreeBuilder):
-    def __init__(self):
-        super().__init__()
-        self.next_label = 1
-        self.edges = []
-    def add_node(self, _):
-        if self.last_node:
-            self.edges.append('    {} -> {};\n'.format(self.last_node, self.next_label))
-        self.last_node = self.next_label
-        self.next_label += 1
-    def get_game_tree(self):
-        filename = 'tests/test.dot'
-        dot_file = open(filename, 'w')
-        dot_file.write('digraph ' + 'test' + ' {\n')
-        for edge in self.edges:
-            dot_file.write(edge)
-        dot_file.write('}\n')
-        dot_file.close()
-        game_tree = GameTree()
-        game_tree.add_node({})
-        return game_tree
+
+class CompactGameTreeBuilder(GameTreeBuilder):
+    game_tree_class = CompactGameTree
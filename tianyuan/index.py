@@ -0,0 +1,141 @@
+import collections
+import heapq
+import json
+import mmap
+import os
+import struct
+import tianyuan.board
+
+# one record per position: canonical hash, game id, pre-order node number
+RECORD = struct.Struct('<QII')
+MANIFEST = 'manifest.json'
+
+IndexEntry = collections.namedtuple('IndexEntry', ['filename', 'game_index', 'node_number'])
+
+def resolve_node_path(game_tree, node_number):
+    # turns a pre-order node number back into the child indexes leading to it from the root
+    stack = [(game_tree.get_root(), ())]
+    while stack:
+        node, path = stack.pop()
+        if node_number == 0:
+            return list(path)
+        node_number -= 1
+        children = game_tree.get_children(node)
+        stack.extend((children[index], path + (index,)) for index in reversed(range(len(children))))
+    raise IndexError('Node number is out of range.')
+
+def read_manifest(directory):
+    filename = os.path.join(directory, MANIFEST)
+    if not os.path.exists(filename):
+        return {'games': [], 'runs': []}
+    with open(filename) as manifest_file:
+        return json.load(manifest_file)
+
+def iter_run(filename):
+    with open(filename, 'rb') as run_file:
+        if os.fstat(run_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(run_file.fileno(), 0, access = mmap.ACCESS_READ) as run_data:
+            yield from RECORD.iter_unpack(run_data)
+
+class PositionIndexWriter:
+    # records are buffered in memory, written out as sorted runs and merged on demand
+    def __init__(self, directory, run_size = 1000000):
+        self.directory = directory
+        self.run_size = run_size
+        os.makedirs(directory, exist_ok = True)
+        manifest = read_manifest(directory)
+        self.games = manifest['games']
+        self.runs = manifest['runs']
+        self.records = []
+    def add_game_tree(self, filename, game_index, game_tree):
+        game_id = len(self.games)
+        self.games.append([filename, game_index])
+        for node_number, (node, board) in enumerate(tianyuan.board.iter_positions(game_tree, track_symmetries = True)):
+            self.records.append((board.get_canonical_hash(), game_id, node_number))
+        if len(self.records) >= self.run_size:
+            self.flush_run()
+    def add_file(self, filename, parser):
+        for game_index, game_tree in enumerate(parser.iter_collection(filename)):
+            self.add_game_tree(filename, game_index, game_tree)
+    def get_run_filename(self, run_number):
+        return 'run-{:06d}.bin'.format(run_number)
+    def next_run_filename(self):
+        run_number = 0
+        while self.get_run_filename(run_number) in self.runs or os.path.exists(os.path.join(self.directory, self.get_run_filename(run_number))):
+            run_number += 1
+        return self.get_run_filename(run_number)
+    def flush_run(self):
+        if not self.records:
+            return
+        self.records.sort()
+        run_filename = self.next_run_filename()
+        with open(os.path.join(self.directory, run_filename), 'wb') as run_file:
+            for record in self.records:
+                run_file.write(RECORD.pack(*record))
+        self.runs.append(run_filename)
+        self.records = []
+        self.write_manifest()
+    def merge(self):
+        # k-way merge of all sorted runs into a single run
+        self.flush_run()
+        if len(self.runs) < 2:
+            return
+        run_filename = self.next_run_filename()
+        with open(os.path.join(self.directory, run_filename), 'wb') as run_file:
+            for record in heapq.merge(*[iter_run(os.path.join(self.directory, run)) for run in self.runs]):
+                run_file.write(RECORD.pack(*record))
+        old_runs = self.runs
+        self.runs = [run_filename]
+        self.write_manifest()
+        for run in old_runs:
+            os.remove(os.path.join(self.directory, run))
+    def write_manifest(self):
+        temporary_filename = os.path.join(self.directory, MANIFEST + '.tmp')
+        with open(temporary_filename, 'w') as manifest_file:
+            json.dump({'games': self.games, 'runs': self.runs}, manifest_file)
+        os.replace(temporary_filename, os.path.join(self.directory, MANIFEST))
+    def close(self):
+        self.flush_run()
+        self.write_manifest()
+
+class PositionIndex:
+    # looks positions up by binary search over the memory-mapped runs
+    def __init__(self, directory):
+        manifest = read_manifest(directory)
+        self.games = manifest['games']
+        self.run_files = []
+        self.runs = []
+        for run in manifest['runs']:
+            run_file = open(os.path.join(directory, run), 'rb')
+            if os.fstat(run_file.fileno()).st_size == 0:
+                run_file.close()
+                continue
+            self.run_files.append(run_file)
+            self.runs.append(mmap.mmap(run_file.fileno(), 0, access = mmap.ACCESS_READ))
+    def lookup(self, position_hash):
+        entries = []
+        for run_data in self.runs:
+            low = 0
+            high = len(run_data) // RECORD.size
+            while low < high:
+                middle = (low + high) // 2
+                if RECORD.unpack_from(run_data, middle * RECORD.size)[0] < position_hash:
+                    low = middle + 1
+                else:
+                    high = middle
+            while low < len(run_data) // RECORD.size:
+                record_hash, game_id, node_number = RECORD.unpack_from(run_data, low * RECORD.size)
+                if record_hash != position_hash:
+                    break
+                filename, game_index = self.games[game_id]
+                entries.append(IndexEntry(filename, game_index, node_number))
+                low += 1
+        return entries
+    def lookup_board(self, board):
+        return self.lookup(board.get_canonical_hash())
+    def close(self):
+        for run_data in self.runs:
+            run_data.close()
+        for run_file in self.run_files:
+            run_file.close()
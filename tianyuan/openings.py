@@ -0,0 +1,328 @@
+import array
+import collections
+import functools
+import struct
+
+COORDINATES = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# moves are packed as point * 2 + colour, with one extra point for passes
+PASS = len(COORDINATES) ** 2
+MOVE_BITS = 13
+MAGIC = b'TYO2'
+# magic, symmetry normalization, maximum depth, maximum references per node, nodes, games,
+# nodes with references, largest count dropped by pruning
+HEADER = struct.Struct('<4sBHHIIII')
+# share of max_nodes that is kept when the tree outgrows it
+PRUNE_FRACTION = 0.75
+
+# the true number of visits (and of wins) of a node is at most error more than counted
+OpeningStatistics = collections.namedtuple('OpeningStatistics', ['node', 'move', 'visits', 'black_wins', 'white_wins', 'games', 'error'])
+
+def encode_move(colour, coordinate):
+    point = PASS if coordinate is None else coordinate[0] + coordinate[1] * len(COORDINATES)
+    return point * 2 + (colour == 'W')
+
+def decode_move(move):
+    point = move >> 1
+    return 'BW'[move & 1], None if point == PASS else (point % len(COORDINATES), point // len(COORDINATES))
+
+def parse_board_size(value):
+    # accepts validated sizes as well as raw values
+    if isinstance(value, bytes):
+        value = value.decode('ascii')
+    if isinstance(value, str):
+        value = tuple(int(part) for part in value.split(':')) if ':' in value else int(value)
+    return value if isinstance(value, tuple) else (value, value)
+
+def parse_coordinate(value, columns, rows):
+    if isinstance(value, bytes):
+        value = value.decode('ascii')
+    if value is None or value == '' or (value == 'tt' and columns <= 19 and rows <= 19):
+        return None
+    if isinstance(value, tuple):
+        return value
+    return COORDINATES.index(value[0]), COORDINATES.index(value[1])
+
+def parse_winner(value):
+    if isinstance(value, bytes):
+        value = value.decode('iso-8859-1')
+    if value[:2] in ('B+', 'W+'):
+        return value[0]
+    return None
+
+@functools.lru_cache(maxsize = None)
+def get_symmetries(columns, rows):
+    # for each symmetry of the board, the image of every coordinate, indexed by x + y * columns
+    transforms = [lambda x, y: (x, y), lambda x, y: (columns - 1 - x, y), lambda x, y: (x, rows - 1 - y), lambda x, y: (columns - 1 - x, rows - 1 - y)]
+    if columns == rows:
+        transforms += [lambda x, y: (y, x), lambda x, y: (rows - 1 - y, x), lambda x, y: (y, columns - 1 - x), lambda x, y: (rows - 1 - y, columns - 1 - x)]
+    return [[transform(point % columns, point // columns) for point in range(columns * rows)] for transform in transforms]
+
+def normalize_moves(moves, columns, rows):
+    # picks the smallest image of every move among the symmetries that are still undecided,
+    # so sequences sharing a prefix up to symmetry also share their normalized prefix
+    candidates = get_symmetries(columns, rows)
+    for colour, coordinate in moves:
+        if coordinate is None:
+            yield colour, None
+            continue
+        point = coordinate[0] + coordinate[1] * columns
+        if len(candidates) == 1:
+            yield colour, candidates[0][point]
+            continue
+        smallest = min(symmetry[point] for symmetry in candidates)
+        candidates = [symmetry for symmetry in candidates if symmetry[point] == smallest]
+        yield colour, smallest
+
+class OpeningTree:
+    # a trie of the first max_depth moves of many games; nodes live in parallel arrays and
+    # siblings are kept linked in order of decreasing visits, so the most common
+    # continuations of a node are its first children. With max_nodes the counts are
+    # lossy: pruning drops the rarest nodes, and a node added again afterwards may have
+    # missed up to the largest dropped count, which is kept per node as its error
+    def __init__(self, normalize_symmetries = False, max_depth = 40, max_references = 8, max_nodes = None):
+        self.normalize_symmetries = normalize_symmetries
+        self.max_depth = max_depth
+        self.max_references = max_references
+        # once exceeded, the rarest nodes are pruned until PRUNE_FRACTION of it is left
+        self.max_nodes = max_nodes
+        self.max_dropped = 0
+        self.game_count = 0
+        self.clear()
+    def clear(self):
+        self.parents = array.array('i', [-1])
+        self.moves = array.array('H', [0])
+        self.visits = array.array('I', [0])
+        self.black_wins = array.array('I', [0])
+        self.white_wins = array.array('I', [0])
+        self.errors = array.array('I', [0])
+        self.first_child = array.array('i', [-1])
+        self.next_sibling = array.array('i', [-1])
+        self.edges = {}
+        self.references = {}
+    def __len__(self):
+        return len(self.parents)
+    def add_node(self, parent, move):
+        node = len(self.parents)
+        self.parents.append(parent)
+        self.moves.append(move)
+        self.visits.append(0)
+        self.black_wins.append(0)
+        self.white_wins.append(0)
+        self.errors.append(self.max_dropped)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.edges[parent << MOVE_BITS | move] = node
+        if self.first_child[parent] == -1:
+            self.first_child[parent] = node
+        else:
+            sibling = self.first_child[parent]
+            while self.next_sibling[sibling] != -1:
+                sibling = self.next_sibling[sibling]
+            self.next_sibling[sibling] = node
+        return node
+    def promote(self, node):
+        # moves a node whose visits just grew in front of the siblings it overtook
+        parent = self.parents[node]
+        previous = -1
+        insert_after = -1
+        sibling = self.first_child[parent]
+        while sibling != node:
+            if self.visits[sibling] >= self.visits[node]:
+                insert_after = sibling
+            previous = sibling
+            sibling = self.next_sibling[sibling]
+        if previous == insert_after:
+            return
+        self.next_sibling[previous] = self.next_sibling[node]
+        if insert_after == -1:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        else:
+            self.next_sibling[node] = self.next_sibling[insert_after]
+            self.next_sibling[insert_after] = node
+    def visit(self, node, winner, game_reference):
+        self.visits[node] += 1
+        if winner == 'B':
+            self.black_wins[node] += 1
+        elif winner == 'W':
+            self.white_wins[node] += 1
+        if self.max_references:
+            references = self.references.setdefault(node, array.array('I'))
+            if len(references) < self.max_references:
+                references.append(game_reference)
+    def add_moves(self, moves, winner = None, game_reference = None, columns = 19, rows = None):
+        # moves are (colour, coordinate) pairs, with None as the coordinate of a pass
+        rows = columns if rows is None else rows
+        if game_reference is None:
+            game_reference = self.game_count
+        self.game_count += 1
+        if self.normalize_symmetries:
+            moves = normalize_moves(moves, columns, rows)
+        node = 0
+        self.visit(node, winner, game_reference)
+        for depth, (colour, coordinate) in enumerate(moves):
+            if depth >= self.max_depth:
+                break
+            move = encode_move(colour, coordinate)
+            child = self.edges.get(node << MOVE_BITS | move)
+            if child is None:
+                child = self.add_node(node, move)
+            self.visit(child, winner, game_reference)
+            self.promote(child)
+            node = child
+        if self.max_nodes is not None and len(self) > self.max_nodes:
+            self.shrink()
+    def add_game_tree(self, game_tree, game_reference = None):
+        root_properties = game_tree.get_properties(game_tree.get_root())
+        columns, rows = parse_board_size(root_properties['SZ'][0]) if 'SZ' in root_properties else (19, 19)
+        winner = parse_winner(root_properties['RE'][0]) if 'RE' in root_properties else None
+        moves = []
+        for node in game_tree.iter_main_line():
+            properties = game_tree.get_properties(node)
+            for colour in 'BW':
+                if colour in properties:
+                    moves.append((colour, parse_coordinate(properties[colour][0], columns, rows)))
+        self.add_moves(moves, winner, game_reference, columns, rows)
+    def find(self, moves, columns = 19, rows = None):
+        rows = columns if rows is None else rows
+        if self.normalize_symmetries:
+            moves = normalize_moves(moves, columns, rows)
+        node = 0
+        for colour, coordinate in moves:
+            node = self.edges.get(node << MOVE_BITS | encode_move(colour, coordinate))
+            if node is None:
+                return None
+        return node
+    def get_statistics(self, node):
+        move = None if node == 0 else decode_move(self.moves[node])
+        return OpeningStatistics(node, move, self.visits[node], self.black_wins[node], self.white_wins[node], list(self.references.get(node, [])), self.errors[node])
+    def get_continuations(self, node = 0, count = 10):
+        # only the first count children are looked at, they are the most visited ones
+        continuations = []
+        child = self.first_child[node]
+        while child != -1 and len(continuations) < count:
+            continuations.append(self.get_statistics(child))
+            child = self.next_sibling[child]
+        return continuations
+    def get_path(self, node):
+        path = []
+        while node > 0:
+            path.append(decode_move(self.moves[node]))
+            node = self.parents[node]
+        return path[::-1]
+    def shrink(self):
+        # the threshold is taken from the current counts, so the tree is rebuilt at most
+        # once per (1 - PRUNE_FRACTION) * max_nodes new nodes; a child is never visited
+        # more than its parent, so the nodes above the threshold stay connected
+        kept = max(int(self.max_nodes * PRUNE_FRACTION) - 1, 0)
+        counts = sorted(self.visits[1:], reverse = True)
+        if len(counts) > kept:
+            self.prune(counts[kept] + 1)
+    def prune(self, minimum_count):
+        # drops every node visited less than minimum_count times, together with its subtree
+        old_moves, old_visits, old_black_wins, old_white_wins, old_errors = self.moves, self.visits, self.black_wins, self.white_wins, self.errors
+        old_first_child, old_next_sibling, old_references = self.first_child, self.next_sibling, self.references
+        self.clear()
+        self.visits[0] = old_visits[0]
+        self.black_wins[0] = old_black_wins[0]
+        self.white_wins[0] = old_white_wins[0]
+        if 0 in old_references:
+            self.references[0] = old_references[0]
+        stack = [(0, 0)]
+        while stack:
+            old_node, node = stack.pop()
+            child = old_first_child[old_node]
+            while child != -1 and old_visits[child] >= minimum_count:
+                # siblings are sorted, so the remaining ones are rarer still
+                new_child = self.add_node(node, old_moves[child])
+                self.visits[new_child] = old_visits[child]
+                self.black_wins[new_child] = old_black_wins[child]
+                self.white_wins[new_child] = old_white_wins[child]
+                self.errors[new_child] = old_errors[child]
+                if child in old_references:
+                    self.references[new_child] = old_references[child]
+                stack.append((child, new_child))
+                child = old_next_sibling[child]
+            if child != -1:
+                # the most visited of the dropped siblings
+                self.max_dropped = max(self.max_dropped, old_visits[child])
+    def save(self, filename):
+        with open(filename, 'wb') as opening_file:
+            opening_file.write(HEADER.pack(MAGIC, self.normalize_symmetries, self.max_depth, self.max_references, len(self), self.game_count, len(self.references), self.max_dropped))
+            for values in (self.parents, self.moves, self.visits, self.black_wins, self.white_wins, self.errors):
+                opening_file.write(values.tobytes())
+            for node, references in self.references.items():
+                opening_file.write(struct.pack('<IH', node, len(references)) + references.tobytes())
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as opening_file:
+            data = opening_file.read()
+        magic, normalize_symmetries, max_depth, max_references, node_count, game_count, reference_count, max_dropped = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('Not an opening tree file.')
+        opening_tree = cls(bool(normalize_symmetries), max_depth, max_references)
+        opening_tree.game_count = game_count
+        opening_tree.max_dropped = max_dropped
+        offset = HEADER.size
+        arrays = []
+        for typecode in 'iHIIII':
+            values = array.array(typecode)
+            values.frombytes(data[offset:offset + node_count * values.itemsize])
+            offset += node_count * values.itemsize
+            arrays.append(values)
+        parents, moves, visits, black_wins, white_wins, errors = arrays
+        for node in range(1, node_count):
+            opening_tree.add_node(parents[node], moves[node])
+        opening_tree.visits, opening_tree.black_wins, opening_tree.white_wins, opening_tree.errors = visits, black_wins, white_wins, errors
+        for _ in range(reference_count):
+            node, length = struct.unpack_from('<IH', data, offset)
+            offset += struct.calcsize('<IH')
+            references = array.array('I')
+            references.frombytes(data[offset:offset + length * references.itemsize])
+            offset += length * references.itemsize
+            opening_tree.references[node] = references
+        opening_tree.sort_children()
+        return opening_tree
+    def sort_children(self):
+        children = collections.defaultdict(list)
+        for node in range(1, len(self)):
+            children[self.parents[node]].append(node)
+        for parent, nodes in children.items():
+            nodes.sort(key = lambda node: -self.visits[node])
+            self.first_child[parent] = nodes[0]
+            for node, next_node in zip(nodes, nodes[1:] + [-1]):
+                self.next_sibling[node] = next_node
+
+class OpeningTreeBuilder:
+    # builder protocol sink that adds the main line of every parsed game to an opening
+    # tree without building the game tree; bind the tree with functools.partial
+    def __init__(self, opening_tree):
+        self.opening_tree = opening_tree
+        self.root_properties = {}
+        self.node_count = 0
+        self.moves = []
+        self.on_main_line = True
+    def start_variation(self):
+        pass
+    def end_variation(self):
+        # the first ")" ends the main line
+        if self.on_main_line:
+            self.on_main_line = False
+            root_properties = self.root_properties
+            columns, rows = parse_board_size(root_properties['SZ'][0]) if 'SZ' in root_properties else (19, 19)
+            winner = parse_winner(root_properties['RE'][0]) if 'RE' in root_properties else None
+            moves = [(colour, parse_coordinate(value, columns, rows)) for colour, value in self.moves]
+            self.opening_tree.add_moves(moves, winner, None, columns, rows)
+    def start_node(self):
+        self.node_count += 1
+    def add_property(self, identifier, values):
+        if not self.on_main_line:
+            return
+        if self.node_count == 1 and identifier in ('SZ', 'RE'):
+            self.root_properties[identifier] = values
+        if identifier in ('B', 'W') and len(self.moves) < self.opening_tree.max_depth:
+            self.moves.append((identifier, values[0]))
+    def end_node(self):
+        pass
+    def get_game_tree(self):
+        return None
@@ -1,180 +1,658 @@
-import string
-import tianyuan.gametree
+import codecs
+import collections
+import collections.abc
+import contextlib
+import functools
+import os
+import re
+import time
+import tianyuan.cache
+import tianyuan.stats
 
 class SGFParserError(Exception):
-    def __init__(self, position, message):
+    def __init__(self, position, message, line = None, column = None):
         self.position = position
         self.message = message
+        self.line = line
+        self.column = column
 
 class SGFSemanticError(Exception):
     def __init__(self, message):
         self.message = message
 
+TREE_DELIMITERS = re.compile(rb'[\[()]')
+VALUE_DELIMITERS = re.compile(rb'[\]\\]')
+# tokens are matched as a whole by one regex call each instead of byte by byte
+WHITESPACE_RUN = re.compile(rb'\s*')
+IDENTIFIER = re.compile(rb'[A-Z]+')
+VALUE_BODY = re.compile(rb'[^\]\\]*(?:\\.[^\]\\]*)*', re.DOTALL)
+VALUE = re.compile(rb'\[(' + VALUE_BODY.pattern + rb')\]\s*', re.DOTALL)
+# a whole well-formed property: identifier, first value body, any further values
+PROPERTY = re.compile(rb'\s*([A-Z]+)\s*\[(' + VALUE_BODY.pattern + rb')\]\s*((?:\[' + VALUE_BODY.pattern + rb'\]\s*)*)', re.DOTALL)
+
+SGFDiagnostic = collections.namedtuple('SGFDiagnostic', ['position', 'line', 'column', 'message'])
+# what values of a game tree are checked against, taken from its root
+ValidationContext = collections.namedtuple('ValidationContext', ['columns', 'rows', 'encoding'])
+
+COORDINATES = b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# properties whose values may be composed of two parts; their raw values keep "\\" and
+# "\:" escaped, so an escaped colon stays apart from the one separating the parts
+COMPOSED_PROPERTIES = frozenset(['SZ', 'AP', 'LB', 'AR', 'LN', 'FG'])
+# everything before the first colon that is not escaped
+COMPOSED_FIRST_PART = re.compile(rb'(?:[^\\:]|\\.)*', re.DOTALL)
+COMPOSED_ESCAPE = re.compile(rb'\\(.)', re.DOTALL)
+VALIDATION_LEVELS = ('none', 'structural', 'full')
+
+def advance_line_column(line, column, sgf_data, end):
+    newlines = sgf_data.count(b'\n', 0, end)
+    if newlines:
+        return line + newlines, end - sgf_data.rfind(b'\n', 0, end)
+    return line, column + end
+
+def unescape_property_value(sgf_data, start, end, composed = False):
+    escape = sgf_data.find(b'\\', start, end)
+    if escape == -1:
+        return sgf_data[start:end]
+    # collect runs between escapes as views into the buffer and join them once
+    sgf_view = memoryview(sgf_data)
+    segments = []
+    while escape != -1:
+        segments.append(sgf_view[start:escape])
+        start = escape + 1
+        # remove "soft" line breaks
+        if sgf_data[start:start + 2] in (b'\n\r', b'\r\n'):
+            start += 2
+        elif sgf_data[start:start + 1] in (b'\n', b'\r'):
+            start += 1
+        elif composed and sgf_data[start:start + 1] in (b'\\', b':'):
+            segments.append(sgf_view[escape:start + 1])
+            start += 1
+        else:
+            segments.append(sgf_view[start:start + 1])
+            start += 1
+        escape = sgf_data.find(b'\\', start, end)
+    segments.append(sgf_view[start:end])
+    return b''.join(segments)
+
+def split_composed_value(value):
+    # returns the unescaped parts of a raw composed value, or None without a separator
+    separator = COMPOSED_FIRST_PART.match(value).end()
+    if separator == len(value):
+        return None
+    return COMPOSED_ESCAPE.sub(rb'\1', value[:separator]), COMPOSED_ESCAPE.sub(rb'\1', value[separator + 1:])
+
+class LazyDecoder:
+    def __init__(self, parser):
+        self.parser = parser
+        self.context = None
+    def decode(self, identifier, sgf_data, spans):
+        composed = identifier in COMPOSED_PROPERTIES
+        values = [unescape_property_value(sgf_data, start, end, composed) for start, end in spans]
+        if self.context is not None:
+            values = self.parser.validate_property(identifier, values, self.context)
+        return values
+
+class LazyPropertyValues(collections.abc.Sequence):
+    # keeps the raw value spans into the source buffer until the values are first read
+    __slots__ = ('identifier', 'sgf_data', 'spans', 'decoder', 'values')
+    def __init__(self, identifier, sgf_data, spans, decoder):
+        self.identifier = identifier
+        self.sgf_data = sgf_data
+        self.spans = spans
+        self.decoder = decoder
+        self.values = None
+    def decode(self):
+        if self.values is None:
+            self.values = self.decoder.decode(self.identifier, self.sgf_data, self.spans)
+            self.sgf_data = None
+            self.spans = None
+            self.decoder = None
+        return self.values
+    def __getitem__(self, index):
+        return self.decode()[index]
+    def __setitem__(self, index, value):
+        self.decode()[index] = value
+    def __len__(self):
+        return len(self.spans) if self.values is None else len(self.values)
+    def __eq__(self, other):
+        return self.decode() == other
+    def __repr__(self):
+        return repr(self.decode())
+    def __reduce__(self):
+        return list, (self.decode(),)
+
 class SGFParser:
-    def __init__(self, builder_class):
+    def __init__(self, builder_class, lazy = False, recover = False, cache = None, properties = None, validation = 'full', stats = False, stats_callback = None, backend = 'native'):
+        if validation not in VALIDATION_LEVELS:
+            raise ValueError('Validation level must be one of {}.'.format(', '.join(VALIDATION_LEVELS)))
+        if backend == 'arpeggio':
+            if lazy or recover:
+                raise ValueError('The arpeggio backend supports neither lazy nor recovering parses.')
+            # optional dependency, only needed for this backend
+            import tianyuan.sgfparser_arpeggio
+            self.backend = tianyuan.sgfparser_arpeggio
+        elif backend == 'native':
+            self.backend = None
+        else:
+            raise ValueError('Backend must be native or arpeggio.')
         self.builder_class = builder_class
-        self.bytes_consumed = 0
-    def consume(self, sgf_data, count):
-        sgf_data = sgf_data[count:]
-        self.bytes_consumed += count
-        return sgf_data
-    def skip_whitespace(self, sgf_data):
-        while sgf_data and (sgf_data[0:1].decode('ascii') in string.whitespace):
-            sgf_data = self.consume(sgf_data, 1)
-        return sgf_data
+        # none: values are left as raw bytes, structural: only SZ and CA are checked
+        # and defaulted, full: every known property is checked and converted
+        self.validation = validation
+        self.validators = self.get_validators()
+        self.lazy = lazy
+        self.recover = recover
+        self.cache = cache
+        # values of properties outside the allow-list are skipped without being unescaped;
+        # SZ and CA are always kept since the other values are checked against them
+        self.properties = None if properties is None else frozenset(properties) | {'SZ', 'CA'}
+        self.recorders = None
+        # instrumentation is off unless asked for, then self.stats describes the last parse
+        self.collect_stats = stats or stats_callback is not None
+        self.stats_callback = stats_callback
+        self.stats = None
+        self.running_stats = None
+        self.diagnostics = []
+        self.lazy_decoder = LazyDecoder(self)
+        self.reset(b'')
+    @property
+    def bytes_consumed(self):
+        return self.base_position + self.position
+    def reset(self, sgf_data, base_position = 0, base_line = 1, base_column = 1):
+        # keep a single immutable buffer and move a cursor over it instead of re-slicing
+        self.sgf_data = bytes(sgf_data)
+        self.position = 0
+        self.base_position = base_position
+        self.base_line = base_line
+        self.base_column = base_column
+    def get_remaining_data(self):
+        return self.sgf_data[self.position:]
+    def peek(self):
+        return self.sgf_data[self.position:self.position + 1]
+    def consume(self, count):
+        self.position = min(self.position + count, len(self.sgf_data))
+    def skip_whitespace(self):
+        self.position = WHITESPACE_RUN.match(self.sgf_data, self.position).end()
+    def new_builder(self):
+        # lazy values of each game tree are validated against that game tree's root
+        self.lazy_decoder = LazyDecoder(self)
+        builder = self.builder_class()
+        if self.recorders is not None:
+            builder = tianyuan.cache.RecordingBuilder(builder)
+            self.recorders.append(builder)
+        if self.running_stats is not None:
+            self.running_stats.game_trees += 1
+            builder = tianyuan.stats.StatsBuilder(builder, self, self.running_stats)
+        return builder
+    @contextlib.contextmanager
+    def measure(self):
+        if not self.collect_stats:
+            yield
+            return
+        stats = self.running_stats = tianyuan.stats.ParseStats()
+        start = time.perf_counter()
+        try:
+            yield
+        except (SGFParserError, SGFSemanticError):
+            stats.errors += 1
+            raise
+        finally:
+            stats.bytes = self.bytes_consumed
+            stats.errors += len(self.diagnostics)
+            stats.scan_time = time.perf_counter() - start - stats.build_time - stats.validate_time
+            self.running_stats = None
+            self.stats = stats
+            if self.stats_callback is not None:
+                self.stats_callback(stats)
     def parse_file(self, filename):
-        sgf_file = open(filename, 'rb')
-        sgf_data = sgf_file.read()
-        sgf_file.close()
-        return self.parse_collection(sgf_data)
+        # lazy, recovering and filtered parses are not cached, their trees depend on more than the file
+        if self.cache is None or self.lazy or self.recover or self.properties is not None:
+            sgf_file = open(filename, 'rb')
+            sgf_data = sgf_file.read()
+            sgf_file.close()
+            return self.parse_collection(sgf_data)
+        cached = self.cache.load(filename, self.validation)
+        if cached is not None:
+            self.reset(b'', cached.size)
+            self.diagnostics = []
+            collection = []
+            with self.measure():
+                for record in cached.records:
+                    if cached.validated:
+                        game_tree = tianyuan.cache.load_game_tree(record, self.new_builder())
+                    else:
+                        game_tree = self.finish_game_tree(tianyuan.cache.build_game_tree(record, self.new_builder()), 0)
+                    if game_tree is not None:
+                        collection.append(game_tree)
+            return collection
+        with open(filename, 'rb') as sgf_file:
+            source_stat = os.fstat(sgf_file.fileno())
+            sgf_data = sgf_file.read()
+        self.recorders = []
+        try:
+            collection = self.parse_collection(sgf_data)
+            recorders = self.recorders
+        finally:
+            self.recorders = None
+        if len(collection) == len(recorders):
+            # trees are stored after validation, so loading them skips the checks
+            self.cache.store(filename, source_stat, sgf_data, self.validation, True, [tianyuan.cache.record_game_tree(game_tree) for game_tree in collection])
+        else:
+            # streaming sinks keep no tree, the raw events are replayed into them instead
+            self.cache.store(filename, source_stat, sgf_data, self.validation, False, [recorder.record for recorder in recorders])
+        return collection
+    def iter_collection(self, sgf_file, chunk_size = 65536):
+        if isinstance(sgf_file, (str, bytes, os.PathLike)):
+            with open(sgf_file, 'rb') as opened_file:
+                yield from self.iter_collection(opened_file, chunk_size)
+            return
+        self.diagnostics = []
+        with self.measure():
+            for base_position, base_line, base_column, sgf_data in self.split_game_trees(sgf_file, chunk_size):
+                self.reset(sgf_data, base_position, base_line, base_column)
+                if self.backend is not None:
+                    yield from self.backend.parse_collection(self, self.sgf_data)
+                    continue
+                builder = self.new_builder()
+                self.parse_game_tree(builder)
+                game_tree = self.finish_game_tree(builder, 0)
+                if game_tree is not None:
+                    yield game_tree
+    def split_game_trees(self, sgf_file, chunk_size):
+        # find the extent of each top-level game tree without parsing it, so only
+        # the game currently being parsed has to be held in memory
+        buffer = bytearray()
+        buffer_position = 0
+        buffer_line = 1
+        buffer_column = 1
+        position = 0
+        game_start = None
+        depth = 0
+        in_value = False
+        games_found = 0
+        end_of_file = False
+        while not end_of_file:
+            chunk = sgf_file.read(chunk_size)
+            if chunk:
+                buffer += chunk
+            else:
+                end_of_file = True
+            while position < len(buffer):
+                if depth == 0:
+                    position = WHITESPACE_RUN.match(buffer, position).end()
+                    if position == len(buffer):
+                        break
+                    if buffer[position:position + 1] != b'(':
+                        line, column = advance_line_column(buffer_line, buffer_column, buffer, position)
+                        if games_found:
+                            self.report(SGFParserError(buffer_position + position, 'Expected end-of-file while parsing collection.', line, column))
+                        else:
+                            self.report(SGFParserError(buffer_position + position, 'Expected "(" while parsing game tree.', line, column))
+                        position = buffer.find(b'(', position)
+                        if position == -1:
+                            position = len(buffer)
+                        continue
+                    game_start = position
+                    depth = 1
+                    position += 1
+                elif in_value:
+                    match = VALUE_DELIMITERS.search(buffer, position)
+                    if not match:
+                        position = len(buffer)
+                    elif buffer[match.start():match.start() + 1] == b']':
+                        in_value = False
+                        position = match.end()
+                    elif match.end() < len(buffer) or end_of_file:
+                        position = match.end() + 1
+                    else:
+                        # escaped byte not read yet
+                        position = match.start()
+                        break
+                else:
+                    match = TREE_DELIMITERS.search(buffer, position)
+                    if not match:
+                        position = len(buffer)
+                        continue
+                    position = match.end()
+                    delimiter = buffer[match.start():match.end()]
+                    if delimiter == b'[':
+                        in_value = True
+                    elif delimiter == b'(':
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            line, column = advance_line_column(buffer_line, buffer_column, buffer, game_start)
+                            yield buffer_position + game_start, line, column, bytes(buffer[game_start:position])
+                            games_found += 1
+                            buffer_line, buffer_column = advance_line_column(buffer_line, buffer_column, buffer, position)
+                            del buffer[:position]
+                            buffer_position += position
+                            position = 0
+                            game_start = None
+        if game_start is not None:
+            # let the parser report where the unterminated game tree breaks
+            line, column = advance_line_column(buffer_line, buffer_column, buffer, game_start)
+            yield buffer_position + game_start, line, column, bytes(buffer[game_start:])
+        elif not games_found and not self.diagnostics:
+            line, column = advance_line_column(buffer_line, buffer_column, buffer, position)
+            self.report(SGFParserError(buffer_position + position, 'Expected "(" while parsing game tree.', line, column))
     def parse_collection(self, sgf_data):
+        self.reset(sgf_data)
+        self.diagnostics = []
         collection = []
-        builder = self.builder_class()
-        sgf_data = self.parse_game_tree(sgf_data, builder)
-        while True:
-            game_tree = builder.get_game_tree()
-            self.check_semantics(game_tree)
-            collection.append(game_tree)
-            try:
-                builder = self.builder_class()
-                sgf_data = self.parse_game_tree(sgf_data, builder)
-            except SGFParserError:
-                break
-        sgf_data = self.skip_whitespace(sgf_data)
-        if sgf_data:
-            raise SGFParserError(self.bytes_consumed, 'Expected end-of-file while parsing collection.')
-        return collection
-    def parse_game_tree(self, sgf_data, builder):
-        sgf_data = self.skip_whitespace(sgf_data)
-        if sgf_data and sgf_data[0:1] == b'(':
-            sgf_data = self.consume(sgf_data, 1)
-            builder.start_variation()
-            sgf_data = self.parse_sequence(sgf_data, builder)
+        with self.measure():
+            if self.backend is not None:
+                return self.backend.parse_collection(self, self.sgf_data)
+            games_found = 0
             while True:
+                self.skip_whitespace()
+                next_byte = self.peek()
+                if next_byte != b'(':
+                    if not next_byte:
+                        if not games_found and not self.diagnostics:
+                            self.report(self.error('Expected "(" while parsing game tree.'))
+                        break
+                    # junk around game trees is skipped up to the next one, as in iter_collection
+                    if games_found:
+                        self.report(self.error('Expected end-of-file while parsing collection.'))
+                    else:
+                        self.report(self.error('Expected "(" while parsing game tree.'))
+                    game_tree_start = self.sgf_data.find(b'(', self.position)
+                    self.position = len(self.sgf_data) if game_tree_start == -1 else game_tree_start
+                    continue
+                game_tree_start = self.position
+                builder = self.new_builder()
+                self.parse_game_tree(builder)
+                games_found += 1
+                game_tree = self.finish_game_tree(builder, game_tree_start)
+                if game_tree is not None:
+                    collection.append(game_tree)
+        return collection
+    def finish_game_tree(self, builder, game_tree_start):
+        game_tree = builder.get_game_tree()
+        if game_tree is None:
+            # streaming sinks write their output as they go and keep no tree to check
+            return None
+        start = time.perf_counter() if self.running_stats is not None else None
+        try:
+            if self.recover:
+                if game_tree.get_root() is None:
+                    return None
                 try:
-                    sgf_data = self.parse_game_tree(sgf_data, builder)
-                except SGFParserError:
-                    break
-            sgf_data = self.skip_whitespace(sgf_data)
-            if sgf_data and sgf_data[0:1] == b')':
-                sgf_data = self.consume(sgf_data, 1)
+                    self.check_semantics(game_tree)
+                except SGFSemanticError as error:
+                    self.report(self.error(error.message, game_tree_start))
+                    return None
+            else:
+                self.check_semantics(game_tree)
+            return game_tree
+        finally:
+            if start is not None:
+                self.running_stats.validate_time += time.perf_counter() - start
+    def parse_game_tree(self, builder):
+        # nested variations are tracked with a depth counter instead of recursion,
+        # the builder keeps the stack of variation start nodes
+        self.skip_whitespace()
+        if self.peek() != b'(':
+            raise self.error('Expected "(" while parsing game tree.')
+        depth = 0
+        next_byte = b'('
+        while True:
+            if next_byte == b'(':
+                self.consume(1)
+                builder.start_variation()
+                depth += 1
+                self.skip_whitespace()
+                if self.peek() == b';':
+                    self.parse_sequence(builder)
+                else:
+                    self.report(self.error('Expected ";" while parsing node.'))
+            elif next_byte == b')':
+                self.consume(1)
                 builder.end_variation()
+                depth -= 1
+                if depth == 0:
+                    return
+            elif not next_byte:
+                # close variations left open at the end of the input
+                while depth:
+                    self.report(self.error('Expected ")" while parsing game tree.'))
+                    builder.end_variation()
+                    depth -= 1
+                return
             else:
-                raise SGFParserError(self.bytes_consumed, 'Expected ")" while parsing game tree.')
-        else:
-            raise SGFParserError(self.bytes_consumed, 'Expected "(" while parsing game tree.')
-        return sgf_data
-    def parse_sequence(self, sgf_data, builder):
-        sgf_data = self.parse_node(sgf_data, builder)
+                self.report(self.error('Expected ")" while parsing game tree.'))
+                self.skip_malformed(b'()', False)
+            self.skip_whitespace()
+            next_byte = self.peek()
+    def parse_sequence(self, builder):
+        self.parse_node(builder)
+        self.skip_whitespace()
+        while self.peek() == b';':
+            self.parse_node(builder)
+            self.skip_whitespace()
+    def parse_node(self, builder):
+        self.skip_whitespace()
+        if self.peek() != b';':
+            raise self.error('Expected ";" while parsing node.')
+        self.consume(1)
+        builder.start_node()
+        identifiers = set()
         while True:
-            try:
-                sgf_data = self.parse_node(sgf_data, builder)
-            except SGFParserError:
-                break
-        return sgf_data
-    def parse_node(self, sgf_data, builder):
-        sgf_data = self.skip_whitespace(sgf_data)
-        if sgf_data and sgf_data[0:1] == b';':
-            sgf_data = self.consume(sgf_data, 1)
-            game_tree_node = tianyuan.gametree.GameTreeNode()
-            while True:
-                try:
-                    sgf_data, identifier, values = self.parse_property(sgf_data)
-                    if identifier in game_tree_node.properties:
-                        raise SGFSemanticError('Duplicate property in the same node.')
-                    else:
-                        game_tree_node.properties[identifier] = values
-                except SGFParserError:
+            match = PROPERTY.match(self.sgf_data, self.position)
+            if match:
+                property_start = match.start(1)
+                identifier, values = self.read_property(match)
+            else:
+                self.skip_whitespace()
+                next_byte = self.peek()
+                if not next_byte or next_byte in b';()':
                     break
-            builder.add_node(game_tree_node)
-        else:
-            raise SGFParserError(self.bytes_consumed, 'Expected ";" while parsing node.')
-        return sgf_data
-    def parse_property(self, sgf_data):
-        values = []
-        sgf_data, identifier = self.parse_property_identifier(sgf_data)
-        sgf_data, value = self.parse_property_value(sgf_data)
-        values.append(value)
+                if not b'A' <= next_byte <= b'Z':
+                    self.report(self.error('Expected uppercase letter while parsing property identifier.'))
+                    self.skip_malformed(b';()', True)
+                    continue
+                property_start = self.position
+                try:
+                    identifier, values = self.parse_property_tokens()
+                except SGFParserError as error:
+                    self.report(error)
+                    self.skip_malformed(b';()', True)
+                    continue
+            if identifier in identifiers:
+                if not self.recover:
+                    raise SGFSemanticError('Duplicate property in the same node.')
+                self.report(self.error('Duplicate property in the same node.', property_start))
+            else:
+                identifiers.add(identifier)
+                if values is not None:
+                    builder.add_property(identifier, values)
+        builder.end_node()
+    def parse_property(self):
+        match = PROPERTY.match(self.sgf_data, self.position)
+        if match:
+            return self.read_property(match)
+        return self.parse_property_tokens()
+    def read_property(self, match):
+        self.position = match.end()
+        identifier = match.group(1).decode('ascii')
+        if self.properties is not None and identifier not in self.properties:
+            return identifier, None
+        spans = [match.span(2)]
+        if match.start(3) != match.end(3):
+            spans.extend(value.span(1) for value in VALUE.finditer(self.sgf_data, match.start(3), match.end(3)))
+        return identifier, self.get_property_values(identifier, spans)
+    def parse_property_tokens(self):
+        # fallback for malformed properties, parse token by token to find where they break
+        spans = []
+        identifier = self.parse_property_identifier()
+        if self.properties is not None and identifier not in self.properties:
+            # filtered out, only find where the values end
+            self.parse_property_value_span()
+            self.skip_whitespace()
+            while self.peek() == b'[':
+                self.parse_property_value_span()
+                self.skip_whitespace()
+            return identifier, None
+        spans.append(self.parse_property_value_span())
+        self.skip_whitespace()
+        while self.peek() == b'[':
+            spans.append(self.parse_property_value_span())
+            self.skip_whitespace()
+        return identifier, self.get_property_values(identifier, spans)
+    def get_property_values(self, identifier, spans):
+        if self.lazy:
+            return LazyPropertyValues(identifier, self.sgf_data, spans, self.lazy_decoder)
+        composed = identifier in COMPOSED_PROPERTIES
+        return [unescape_property_value(self.sgf_data, start, end, composed) for start, end in spans]
+    def parse_property_identifier(self):
+        self.skip_whitespace()
+        match = IDENTIFIER.match(self.sgf_data, self.position)
+        if not match:
+            raise self.error('Expected uppercase letter while parsing property identifier.')
+        self.position = match.end()
+        return match.group().decode('ascii')
+    def parse_property_value(self):
+        start, end = self.parse_property_value_span()
+        return unescape_property_value(self.sgf_data, start, end)
+    def parse_property_value_span(self):
+        self.skip_whitespace()
+        if self.peek() != b'[':
+            raise self.error('Expected "[" while parsing property value.')
+        self.consume(1)
+        start = self.position
+        end = self.find_property_value_end(start)
+        if end == -1:
+            self.position = len(self.sgf_data)
+            raise self.error('Expected "]" while parsing property value.')
+        self.position = end + 1
+        return start, end
+    def find_property_value_end(self, position):
+        # index of the "]" closing the value body starting at position, or -1
+        end = VALUE_BODY.match(self.sgf_data, position).end()
+        return end if self.sgf_data[end:end + 1] == b']' else -1
+    def skip_malformed(self, delimiters, stop_at_property):
+        # used in recovery mode: skip to the next delimiter (or property), stepping over whole values
         while True:
-            try:
-                sgf_data, value = self.parse_property_value(sgf_data)
-                values.append(value)
-            except SGFParserError:
-                break
-        return sgf_data, identifier, values
-    def parse_property_identifier(self, sgf_data):
-        identifier = b''
-        sgf_data = self.skip_whitespace(sgf_data)
-        if sgf_data and (sgf_data[0:1].decode('ascii') in string.ascii_uppercase):
-            identifier += sgf_data[0:1]
-            sgf_data = self.consume(sgf_data, 1)
-            while sgf_data and (sgf_data[0:1].decode('ascii') in string.ascii_uppercase):
-                identifier += sgf_data[0:1]
-                sgf_data = self.consume(sgf_data, 1)
-        else:
-            raise SGFParserError(self.bytes_consumed, 'Expected uppercase letter while parsing property identifier.')
-        return sgf_data, identifier.decode('ascii')
-    def parse_property_value(self, sgf_data):
-        value = b''
-        sgf_data = self.skip_whitespace(sgf_data)
-        if sgf_data and sgf_data[0:1] == b'[':
-            sgf_data = self.consume(sgf_data, 1)
-            while sgf_data and sgf_data[0:1] != b']':
-                if sgf_data[0:1] == b'\\':
-                    sgf_data = self.consume(sgf_data, 1)
-                    # remove "soft" line breaks
-                    if sgf_data and sgf_data[0:1] == b'\n': 
-                        sgf_data = self.consume(sgf_data, 1)
-                        if sgf_data and sgf_data[0:1] == b'\r': 
-                            sgf_data = self.consume(sgf_data, 1)
-                    elif sgf_data and sgf_data[0:1] == b'\r': 
-                        sgf_data = self.consume(sgf_data, 1)
-                        if sgf_data and sgf_data[0:1] == b'\n': 
-                            sgf_data = self.consume(sgf_data, 1)
-                if sgf_data:
-                    value += sgf_data[0:1]
-                    sgf_data = self.consume(sgf_data, 1)
-            if sgf_data:
-                sgf_data = self.consume(sgf_data, 1)
+            next_byte = self.peek()
+            if not next_byte or next_byte in delimiters or (stop_at_property and b'A' <= next_byte <= b'Z'):
+                return
+            if next_byte == b'[':
+                end = self.find_property_value_end(self.position + 1)
+                if end == -1:
+                    self.position = len(self.sgf_data)
+                    return
+                self.position = end + 1
             else:
-                raise SGFParserError(self.bytes_consumed, 'Expected "]" while parsing property value.')
-        else:
-            raise SGFParserError(self.bytes_consumed, 'Expected "[" while parsing property value.')
-        return sgf_data, value
+                self.consume(1)
+    def error(self, message, position = None):
+        if position is None:
+            position = self.position
+        line, column = advance_line_column(self.base_line, self.base_column, self.sgf_data, position)
+        return SGFParserError(self.base_position + position, message, line, column)
+    def report(self, error):
+        if not self.recover:
+            raise error
+        self.diagnostics.append(SGFDiagnostic(error.position, error.line, error.column, error.message))
     def check_semantics(self, game_tree):
-        if 'SZ' in game_tree.get_root().properties:
-            game_tree.get_root().properties['SZ'][0] = self.validate_alternative(self.validate_composed(self.validate_number, self.validate_number), self.validate_number, game_tree.get_root().properties['SZ'][0])
+        if self.validation == 'none':
+            return
+        root_properties = game_tree.get_properties(game_tree.get_root())
+        if 'SZ' in root_properties:
+            game_tree.set_root_property('SZ', [self.validate_alternative(lambda value: self.validate_composed(self.validate_number, self.validate_number, value), self.validate_number, root_properties['SZ'][0])])
         else:
-            game_tree.get_root().properties['SZ'] = [19]
-        if 'CA' in game_tree.get_root().properties:
-            self.validate_simple_text(game_tree.get_root().properties['CA'][0])
+            game_tree.set_root_property('SZ', [19])
+        if 'CA' in root_properties:
+            game_tree.set_root_property('CA', [self.validate_simple_text(root_properties['CA'][0])])
         else:
-            game_tree.get_root().properties['CA'] = ['iso-8859-1']
-        self.check_node(game_tree.get_root(), game_tree)
-    def check_node(self, node, game_tree):
-        for property in node.properties:
-            self.check_property(property, node, game_tree)
-            # TODO: delete faulty properties
-        print('\n')
-        for child in game_tree.get_children(node):
-            self.check_node(child, game_tree)
-    def check_property(self, property, node, game_tree):
-        print(property)
-        print(repr(node.properties[property]))
-        # TODO: check for superfluous values
-        if property in ['DM', 'GB', 'GW', 'HO', 'UC', 'BM', 'TE']: # value type double
-            node.properties[property][0] = self.validate_double(node.properties[property][0])
-        elif property in ['PL']: # value type color
-            node.properties[property][0] = self.validate_color(node.properties[property][0])
-        elif property in ['B', 'W']: # value type stone, point or move
-            node.properties[property][0] = self.validate_coordinate(node.properties[property][0])
-        elif property in ['AB', 'AE', 'AW', 'CR', 'MA', 'SL', 'SQ', 'TR']: # value type list of stone, point or move
-            if node.properties[property] > 0:
-                node.properties[property] = [self.convert_coordinate(value.decode('ascii')) for value in node.properties[property]]
+            game_tree.set_root_property('CA', ['iso-8859-1'])
+        if self.validation == 'structural':
+            return
+        context = self.get_validation_context(game_tree)
+        if self.lazy:
+            # lazy values are validated by their decoder when first read
+            self.lazy_decoder.context = context
+        else:
+            self.check_node(game_tree.get_root(), game_tree, context)
+    def get_validation_context(self, game_tree):
+        board_size = game_tree.get_root_property('SZ')[0]
+        columns, rows = board_size if isinstance(board_size, tuple) else (board_size, board_size)
+        try:
+            encoding = codecs.lookup(game_tree.get_root_property('CA')[0]).name
+        except LookupError:
+            encoding = 'iso-8859-1'
+        return ValidationContext(columns, rows, encoding)
+    def check_node(self, node, game_tree, context):
+        for node in game_tree.iter_preorder(node):
+            for identifier, values in game_tree.get_properties(node).items():
+                if identifier in self.validators:
+                    # TODO: delete faulty properties
+                    game_tree.set_property(node, identifier, self.validators[identifier](values, context))
+    def validate_property(self, identifier, values, context):
+        if identifier in self.validators:
+            return self.validators[identifier](values, context)
+        return values
+    def get_validators(self):
+        # property identifier -> validator for its list of values, following the FF[4] value types;
+        # SZ and CA are checked first in check_semantics, since the others depend on them
+        move = self.validate_coordinate
+        point = lambda value, context: self.validate_coordinate(value, context, False)
+        number = lambda value, context: self.validate_number(value)
+        real = lambda value, context: self.validate_real(value)
+        double = lambda value, context: self.validate_double(value)
+        color = lambda value, context: self.validate_color(value)
+        none = lambda value, context: self.validate_none(value)
+        text = lambda value, context: self.validate_text(value, context.encoding)
+        simple_text = lambda value, context: self.validate_simple_text(value, context.encoding)
+        point_pair = lambda value, context: self.validate_composed(lambda part: point(part, context), lambda part: point(part, context), value)
+        label = lambda value, context: self.validate_composed(lambda part: point(part, context), lambda part: simple_text(part, context), value)
+        application = lambda value, context: self.validate_composed(lambda part: simple_text(part, context), lambda part: simple_text(part, context), value)
+        figure = lambda value, context: self.validate_alternative(lambda value: none(value, context), lambda value: self.validate_composed(self.validate_number, lambda part: simple_text(part, context), value), value)
+        single = lambda validator: functools.partial(self.validate_single, validator)
+        validators = {}
+        for identifiers, validator in [
+            (['B', 'W'], single(move)),
+            (['AB', 'AE', 'AW', 'CR', 'MA', 'SL', 'SQ', 'TR'], functools.partial(self.validate_point_list, False)),
+            (['DD', 'VW', 'TB', 'TW'], functools.partial(self.validate_point_list, True)),
+            (['AR', 'LN'], functools.partial(self.validate_list, point_pair)),
+            (['LB'], functools.partial(self.validate_list, label)),
+            (['DM', 'GB', 'GW', 'HO', 'UC', 'BM', 'TE'], single(double)),
+            (['PL'], single(color)),
+            (['DO', 'IT', 'KO'], single(none)),
+            (['V', 'KM', 'TM', 'BL', 'WL'], single(real)),
+            (['FF', 'GM', 'ST', 'HA', 'MN', 'OB', 'OW', 'PM'], single(number)),
+            (['C', 'GC'], single(text)),
+            (['N', 'AN', 'BR', 'BT', 'CP', 'DT', 'EV', 'GN', 'ON', 'OT', 'PB', 'PC', 'PW', 'RE', 'RO', 'RU', 'SO', 'US', 'WR', 'WT'], single(simple_text)),
+            (['AP'], single(application)),
+            (['FG'], single(figure))]:
+            for identifier in identifiers:
+                validators[identifier] = validator
+        return validators
+    def validate_single(self, value_validator, values, context):
+        if len(values) != 1:
+            raise SGFSemanticError('Property must have exactly one value.')
+        return [value_validator(values[0], context)]
+    def validate_list(self, value_validator, values, context):
+        return [value_validator(value, context) for value in values]
+    def validate_point_list(self, allow_empty, values, context):
+        if list(values) == [b'']:
+            if allow_empty:
+                return []
+            raise SGFSemanticError('List of property values must not be empty.')
+        points = []
+        for value in values:
+            if b':' in value:
+                # compressed rectangle of points
+                (first_x, first_y), (second_x, second_y) = self.validate_composed(lambda part: self.validate_coordinate(part, context, False), lambda part: self.validate_coordinate(part, context, False), value)
+                points.extend((x, y) for y in range(min(first_y, second_y), max(first_y, second_y) + 1) for x in range(min(first_x, second_x), max(first_x, second_x) + 1))
             else:
-                raise SGFSemanticError('List of value of property \'{property}\' must not be empty.')
-        elif property in ['DD', 'VW', 'TW', 'TB']: # value type possibly empty list of stone, point or move
-            node.properties[property] = [self.convert_coordinate(value.decode('ascii')) for value in node.properties[property]]
+                points.append(self.validate_coordinate(value, context, False))
+        return points
+    def validate_none(self, value):
+        if value != b'':
+            raise SGFSemanticError('Value must be empty.')
+        return None
     def validate_double(self, value):
         if value == b'1' or value == b'2':
             return int(value)
@@ -185,19 +663,16 @@ class SGFParser:
             return value.decode('ascii')
         else:
             raise SGFSemanticError('Value must be \'B\' or \'W\'.')
-    def validate_coordinate(self, value):
-        try:
-            value = value.decode('ascii')
-            coordinates = 'abcdefghijklmnopqrstuvwxyzABCEFGHIJKLMNOPQRSTUVWXYZ'
-            board_size = game_tree.get_root().properties['SZ']
-            if value == '' or (len(board_size) == 1 and board_size[0] <= 19) or (len(board_size) == 2 and board_size[0] <= 19 and board_size[1] <= 19): # via get root prop
-                coordinate = None
-            else:
-                coordinate = (coordinates.index(value[0]), coordinates.index(value[1]))
-            return coordinate
-        except ValueError:
-            raise SGFSemanticError('Value of property \'{property}\' must be a legal board coordinate.')    def validate_number(self, value):
-        pass
+    def validate_coordinate(self, value, context, allow_pass = True):
+        if allow_pass and (value == b'' or (value == b'tt' and context.columns <= 19 and context.rows <= 19)):
+            return None
+        if len(value) != 2:
+            raise SGFSemanticError('Value must be a legal board coordinate.')
+        x = COORDINATES.find(value[0:1])
+        y = COORDINATES.find(value[1:2])
+        if not (0 <= x < context.columns and 0 <= y < context.rows):
+            raise SGFSemanticError('Value must be a legal board coordinate.')
+        return x, y
     def validate_number(self, value):
         try:
             value = value.decode('ascii')
@@ -211,29 +686,23 @@ class SGFParser:
         except ValueError:
             raise SGFSemanticError('Value must be a floating point number.')
     def validate_text(self, value, encoding = 'iso-8859-1'):
-        value = value.decode(charset)
+        try:
+            value = value.decode(encoding)
+        except UnicodeDecodeError:
+            raise SGFSemanticError('Text must be encoded in {}.'.format(encoding))
         lines = re.split('\r\n|\n\r|\r|\n', value)
-        lines = [re.sub('\s', ' ', line) for line in lines]
+        lines = [re.sub(r'\s', ' ', line) for line in lines]
         return '\n'.join(lines)
     def validate_simple_text(self, value, encoding = 'iso-8859-1'):
         value = self.validate_text(value, encoding)
         return re.sub('\n', ' ', value)
-    def validate_list_or_none(self, element_validator, values):
-        return [element_validator(value) for value in values]
-    def validate_list(self, element_validator, values):
-        if len(values) > 0:
-            return self.validate_list_or_none(element_validator, values)
-        else:
-            raise SGFSemanticError('List of property values must not be empty.')
     def validate_composed(self, first_validator, second_validator, value):
-        if value.find(b':') == -1:
+        parts = split_composed_value(value)
+        if parts is None:
             raise SGFSemanticError('Value must contain \':\'.')
-        else:
-            parts = value.split(b':')
-            return first_validator(parts[0]), second_validator(parts[1])
+        return first_validator(parts[0]), second_validator(parts[1])
     def validate_alternative(self, first_validator, second_validator, value):
         try:
             return first_validator(value)
         except SGFSemanticError:
             return second_validator(value)
-
@@ -1,37 +1,97 @@
 import arpeggio
+import tianyuan.sgfparser
+
+# alternative backend for SGFParser(..., backend = 'arpeggio'), driving the same builder
+# protocol from a PEG grammar; arpeggio is an optional dependency and only imported
+# when this backend is selected. The input is decoded as iso-8859-1, which maps every
+# byte to one character, so positions in the parse tree are byte offsets.
 
 def sgf_collection():
     return arpeggio.OneOrMore(sgf_game_tree), arpeggio.EOF
-    
+
 def sgf_game_tree():
     return '(', sgf_sequence, arpeggio.ZeroOrMore(sgf_game_tree), ')'
-    
+
 def sgf_sequence():
     return arpeggio.OneOrMore(sgf_node)
-    
+
 def sgf_node():
     return ';', arpeggio.ZeroOrMore(sgf_property)
-    
+
 def sgf_property():
     return sgf_property_identifier, arpeggio.OneOrMore(sgf_property_value)
 
 def sgf_property_identifier():
-    return arpeggio.OneOrMore(sgf_uppercase_letter)
-    
+    return arpeggio.RegExMatch(r'[A-Z]+')
+
 def sgf_property_value():
-    return '[', sgf_compose_or_value_type, ']'
-
-def sgf_compose_or_value_type():
-    return arpeggio.ZeroOrMore(sgf_value_type)
-#    return [sgf_value_type, sgf_compose]
-    
-def sgf_value_type():
-    return arpeggio.RegExMatch(r'[^\]]')
-#    return [sgf_none, sgf_number, sgf_real, sgf_double, sgf_color, sgf_simple_text, sgf_text, sgf_point, sgf_move, sgf_stone]
-    
-def sgf_uppercase_letter():
-    return arpeggio.RegExMatch('[A-Z]')
-    
-parser = arpeggio.ParserPython(sgf_collection, debug = True)
-parser.parse(open('test.sgf', 'r').read())
+    # a whole bracketed value in one match, escaped bytes included
+    return arpeggio.RegExMatch(r'\[[^\]\\]*(?:\\[\s\S][^\]\\]*)*\]')
+
+# built once, the grammar does not change between parses
+GRAMMAR = arpeggio.ParserPython(sgf_collection, memoization = True, debug = False)
+
+class GameTreeVisitor(arpeggio.PTNodeVisitor):
+    # turns the parse tree into (sequence, variations) pairs, with each node its span after
+    # the ";" and a list of (identifier, value spans); emit_game_tree drives the builder from these
+    def visit_sgf_property_identifier(self, node, children):
+        return node.value
+    def visit_sgf_property_value(self, node, children):
+        return node.position + 1, node.position + len(node.value) - 1
+    def visit_sgf_property(self, node, children):
+        return children[0], list(children[1:])
+    def visit_sgf_node(self, node, children):
+        return node.position + 1, node.position_end, list(children)
+    def visit_sgf_sequence(self, node, children):
+        return list(children)
+    def visit_sgf_game_tree(self, node, children):
+        return node.position, children[0], list(children[1:])
+    def visit_sgf_collection(self, node, children):
+        return list(children)
+
+def emit_game_tree(parser, game_tree, builder):
+    stack = [game_tree]
+    while stack:
+        game_tree = stack.pop()
+        if game_tree is None:
+            builder.end_variation()
+            continue
+        _, sequence, variations = game_tree
+        builder.start_variation()
+        for node_start, node_end, properties in sequence:
+            # the parser's position is what stats measure node sizes with
+            parser.position = node_start
+            builder.start_node()
+            identifiers = set()
+            for identifier, spans in properties:
+                if identifier in identifiers:
+                    raise tianyuan.sgfparser.SGFSemanticError('Duplicate property in the same node.')
+                identifiers.add(identifier)
+                if parser.properties is None or identifier in parser.properties:
+                    builder.add_property(identifier, parser.get_property_values(identifier, spans))
+            # the native scanner has skipped the whitespace after the node by then
+            parser.position = tianyuan.sgfparser.WHITESPACE_RUN.match(parser.sgf_data, node_end).end()
+            builder.end_node()
+        stack.append(None)
+        stack.extend(reversed(variations))
 
+def parse_collection(parser, sgf_data):
+    # parser has already been reset to sgf_data
+    try:
+        parse_tree = GRAMMAR.parse(sgf_data.decode('iso-8859-1'))
+        game_trees = arpeggio.visit_parse_tree(parse_tree, GameTreeVisitor())
+    except arpeggio.NoMatch as error:
+        error.eval_attrs()
+        raise parser.error('{}.'.format(error.message), error.position)
+    except RecursionError:
+        # both the grammar and the visitor recurse once per nested variation
+        raise parser.error('Variations are nested too deeply for the arpeggio backend.', 0)
+    collection = []
+    for game_tree in game_trees:
+        builder = parser.new_builder()
+        emit_game_tree(parser, game_tree, builder)
+        game_tree = parser.finish_game_tree(builder, game_tree[0])
+        if game_tree is not None:
+            collection.append(game_tree)
+    parser.position = len(sgf_data)
+    return collection
@@ -0,0 +1,150 @@
+import codecs
+import json
+import tianyuan.sgfparser
+
+COORDINATES = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# the sinks below take the place of a builder and write every event out as it
+# arrives, so nothing is kept per node; bind the output file with functools.partial
+# to use one as builder_class, e.g. SGFParser(functools.partial(SGFWriter, sgf_file))
+
+def escape_property_value(value, composed = False):
+    # raw composed values already carry their backslash and colon escapes
+    if composed:
+        return value.replace(b']', b'\\]')
+    return value.replace(b'\\', b'\\\\').replace(b']', b'\\]')
+
+def format_point(value):
+    return (COORDINATES[value[0]] + COORDINATES[value[1]]).encode('ascii')
+
+def format_composed_part(value, encoding):
+    # in the raw form of composed values, where backslashes and colons stay escaped
+    if isinstance(value, tuple):
+        return format_point(value)
+    if isinstance(value, str):
+        return value.encode(encoding).replace(b'\\', b'\\\\').replace(b':', b'\\:')
+    return repr(value).encode('ascii')
+
+def format_property_value(identifier, value, encoding = 'iso-8859-1'):
+    # turns a validated value back into its raw SGF form: point:point for AR and LN,
+    # point:text for LB, text:text for AP, number:text for FG and number:number for SZ
+    if isinstance(value, bytes):
+        return value
+    if value is None:
+        # pass, or a property without value
+        return b''
+    if isinstance(value, tuple):
+        if identifier in tianyuan.sgfparser.COMPOSED_PROPERTIES:
+            return b':'.join(format_composed_part(part, encoding) for part in value)
+        return format_point(value)
+    if isinstance(value, (int, float)):
+        return repr(value).encode('ascii')
+    return value.encode(encoding)
+
+class SGFWriter:
+    def __init__(self, sgf_file):
+        self.sgf_file = sgf_file
+        self.depth = 0
+    def start_variation(self):
+        self.sgf_file.write(b'(')
+        self.depth += 1
+    def end_variation(self):
+        self.depth -= 1
+        self.sgf_file.write(b')\n' if self.depth == 0 else b')')
+    def start_node(self):
+        self.sgf_file.write(b';')
+    def add_property(self, identifier, values):
+        self.sgf_file.write(identifier.encode('ascii'))
+        composed = identifier in tianyuan.sgfparser.COMPOSED_PROPERTIES
+        for value in values:
+            self.sgf_file.write(b'[' + escape_property_value(value, composed) + b']')
+    def end_node(self):
+        pass
+    def get_game_tree(self):
+        return None
+
+class DotWriter:
+    def __init__(self, dot_file, name = 'game'):
+        self.dot_file = dot_file
+        self.name = name
+        self.next_label = 0
+        self.last_node = None
+        self.variation_stack = []
+    def start_variation(self):
+        if not self.variation_stack:
+            self.dot_file.write('digraph {} {{\n'.format(self.name))
+        self.variation_stack.append(self.last_node)
+    def end_variation(self):
+        self.last_node = self.variation_stack.pop()
+        if not self.variation_stack:
+            self.dot_file.write('}\n')
+    def start_node(self):
+        if self.last_node is not None:
+            self.dot_file.write('    {} -> {};\n'.format(self.last_node, self.next_label))
+        self.last_node = self.next_label
+        self.next_label += 1
+    def add_property(self, identifier, values):
+        pass
+    def end_node(self):
+        pass
+    def get_game_tree(self):
+        return None
+
+class JSONLinesWriter:
+    # one object per node; raw values are decoded losslessly as iso-8859-1 by default
+    def __init__(self, json_file, encoding = 'iso-8859-1'):
+        self.json_file = json_file
+        self.encoding = encoding
+        self.next_node = 0
+        self.last_node = None
+        self.variation_stack = []
+        self.properties = None
+    def start_variation(self):
+        self.variation_stack.append(self.last_node)
+    def end_variation(self):
+        self.last_node = self.variation_stack.pop()
+    def start_node(self):
+        self.properties = {}
+    def add_property(self, identifier, values):
+        self.properties[identifier] = [value.decode(self.encoding) for value in values]
+    def end_node(self):
+        self.json_file.write(json.dumps({'node': self.next_node, 'parent': self.last_node, 'properties': self.properties}) + '\n')
+        self.last_node = self.next_node
+        self.next_node += 1
+        self.properties = None
+    def get_game_tree(self):
+        return None
+
+def get_encoding(game_tree):
+    charset = game_tree.get_root_property('CA')
+    try:
+        return codecs.lookup(charset[0]).name
+    except (TypeError, LookupError):
+        return 'iso-8859-1'
+
+def emit_game_tree(game_tree, builder):
+    # walks an in-memory game tree as builder events, opening a variation wherever a node has siblings
+    encoding = get_encoding(game_tree)
+    builder.start_variation()
+    stack = [('node', game_tree.get_root())]
+    while stack:
+        event, node = stack.pop()
+        if event == 'end':
+            builder.end_variation()
+            continue
+        if event == 'start':
+            builder.start_variation()
+            stack.append(('end', None))
+        builder.start_node()
+        for identifier, values in game_tree.get_properties(node).items():
+            builder.add_property(identifier, [format_property_value(identifier, value, encoding) for value in values])
+        builder.end_node()
+        children = game_tree.get_children(node)
+        if len(children) == 1:
+            stack.append(('node', children[0]))
+        else:
+            stack.extend(('start', child) for child in reversed(children))
+    builder.end_variation()
+
+def write_game_tree(game_tree, sgf_file):
+    emit_game_tree(game_tree, SGFWriter(sgf_file))
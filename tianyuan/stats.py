@@ -0,0 +1,63 @@
+import time
+
+class ParseStats:
+    # counters and timings of one parse; sizes are in bytes of source, a node's size is
+    # that of its properties; scan time is whatever the builder and the semantic checks
+    # did not take, lazily decoded values are validated outside of it
+    def __init__(self):
+        self.bytes = 0
+        self.game_trees = 0
+        self.nodes = 0
+        self.properties = 0
+        self.values = 0
+        self.variations = 0
+        self.errors = 0
+        self.largest_node = 0
+        self.largest_value = 0
+        self.scan_time = 0.0
+        self.build_time = 0.0
+        self.validate_time = 0.0
+    def as_dict(self):
+        return dict(vars(self))
+    def __repr__(self):
+        return 'ParseStats({})'.format(', '.join('{}={!r}'.format(name, value) for name, value in vars(self).items()))
+
+class StatsBuilder:
+    # counts builder events and the time spent in the wrapped builder; only used while stats are collected
+    def __init__(self, builder, parser, stats):
+        self.builder = builder
+        self.parser = parser
+        self.stats = stats
+        self.node_start = 0
+    def start_variation(self):
+        start = time.perf_counter()
+        self.builder.start_variation()
+        self.stats.variations += 1
+        self.stats.build_time += time.perf_counter() - start
+    def end_variation(self):
+        start = time.perf_counter()
+        self.builder.end_variation()
+        self.stats.build_time += time.perf_counter() - start
+    def start_node(self):
+        start = time.perf_counter()
+        self.node_start = self.parser.position
+        self.builder.start_node()
+        self.stats.nodes += 1
+        self.stats.build_time += time.perf_counter() - start
+    def add_property(self, identifier, values):
+        start = time.perf_counter()
+        self.builder.add_property(identifier, values)
+        self.stats.properties += 1
+        self.stats.values += len(values)
+        # values replayed from the cache may already be validated and have no source size
+        spans = getattr(values, 'spans', None)
+        sizes = [end - value_start for value_start, end in spans] if spans is not None else [len(value) for value in values if isinstance(value, bytes)]
+        self.stats.largest_value = max([self.stats.largest_value] + sizes)
+        self.stats.build_time += time.perf_counter() - start
+    def end_node(self):
+        start = time.perf_counter()
+        self.builder.end_node()
+        self.stats.largest_node = max(self.stats.largest_node, self.parser.position - self.node_start)
+        self.stats.build_time += time.perf_counter() - start
+    def get_game_tree(self):
+        return self.builder.get_game_tree()